@@ -1,58 +1,57 @@
 #!/usr/bin/env python3
 from msresist.figures.common import overlayCartoon
-import sys
+import argparse
+import importlib
 import logging
 import time
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib
 
 matplotlib.use("AGG")
+import matplotlib.pyplot as plt  # noqa: E402
 
 fdir = "./"
 cartoon_dir = r"./msresist/figures"
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
 
-if __name__ == "__main__":
-    nameOut = "figure" + sys.argv[1]
+# Cartoons overlaid on each figure: (file, x, y, scale)
+cartoons = {
+    "1": [("AXLmuts_diagram.svg", 35, 0, 0.06), ("Migration.svg", 550, 10, 0.40), ("island.svg", 765, 20, 0.37)],
+    "2": [("pipeline.svg", 80, 10, 0.15), ("AXL_MS_heatmap.svg", 560, 0, 0.09)],
+    "M2": [("missingness_diagram.svg", 170, 0, 1)],
+    "M5": [("heatmap_NATvsTumor.svg", 50, 0, 0.40)],
+}
+
+
+def genFigure(name):
+    """ Render figure<name>.svg. Data and models memoized by the figure modules are reused by later figures in the same process. """
+    nameOut = "figure" + name
 
     start = time.time()
 
-    exec("from msresist.figures." + nameOut + " import makeFigure")
-    ff = makeFigure()
+    ff = importlib.import_module("msresist.figures." + nameOut).makeFigure()
     ff.savefig(fdir + nameOut + ".svg", dpi=ff.dpi, bbox_inches="tight", pad_inches=0)
+    plt.close(ff)
 
     logging.info("%s is done after %s seconds.", nameOut, time.time() - start)
 
-    if sys.argv[1] == "1":
-        # Overlay Figure 1 AXL mutants diagram
-        overlayCartoon(fdir + 'figure1.svg',
-                       f'{cartoon_dir}/AXLmuts_diagram.svg', 35, 0, scalee=0.06)
-
-    if sys.argv[1] == "1":
-        # Overlay Figure 1 Migration
-        overlayCartoon(fdir + 'figure1.svg',
-                       f'{cartoon_dir}/Migration.svg', 550, 10, scalee=0.40)
-
-    if sys.argv[1] == "1":
-        # Overlay Figure 1 Island effect
-        overlayCartoon(fdir + 'figure1.svg',
-                       f'{cartoon_dir}/island.svg', 765, 20, scalee=0.37)
-
-    if sys.argv[1] == "2":
-        # Overlay Figure 2 pipeline
-        overlayCartoon(fdir + 'figure2.svg',
-                       f'{cartoon_dir}/pipeline.svg', 80, 10, scalee=0.15)
-
-    if sys.argv[1] == "2":
-        # Overlay Figure 2 heatmap
-        overlayCartoon(fdir + 'figure2.svg',
-                       f'{cartoon_dir}/AXL_MS_heatmap.svg', 560, 0, scalee=0.09)
-
-    if sys.argv[1] == 'M2':
-        # Overlay Figure missingness cartoon
-        overlayCartoon(fdir + 'figureM2.svg',
-                       f'{cartoon_dir}/missingness_diagram.svg', 170, 0, scalee=1)
-
-    if sys.argv[1] == "M5":
-        # Overlay Figure tumor vs NATs heatmap
-        overlayCartoon(fdir + 'figureM5.svg',
-                       f'{cartoon_dir}/heatmap_NATvsTumor.svg', 50, 0, scalee=0.40)
+    for cartoon, x, y, scalee in cartoons.get(name, []):
+        overlayCartoon(fdir + nameOut + ".svg", f"{cartoon_dir}/{cartoon}", x, y, scalee=scalee)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render figures, e.g. genFigure.py M4 M5 M6 MS5")
+    parser.add_argument("names", nargs="+", help="figures to render, as in msresist/figures/figure<name>.py")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes (default: render in this process)")
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            list(executor.map(genFigure, args.names))
+    else:
+        for name in args.names:
+            genFigure(name)
+
+    if len(args.names) > 1:
+        logging.info("%d figures are done after %s seconds.", len(args.names), time.time() - start)
@@ -1,14 +1,20 @@
 """Binomial probability calculation to compute sequence distance between sequences and clusters."""
 
 
+import os
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 import scipy.stats as sp
 import scipy.special as sc
-from Bio import motifs
+from scipy.sparse import csr_matrix
+from numba import njit, prange
 from Bio.Seq import Seq
 from pomegranate.distributions import CustomDistribution
 
+path = os.path.dirname(os.path.abspath(__file__))
+PsPfile = os.path.join(path, "data/Sequence_analysis/pX_dataset_PhosphoSitePlus2019")
+
 # Binomial method inspired by Schwartz & Gygi's Nature Biotech 2005: doi:10.1038/nbt1146
 
 # Amino acids frequencies (http://www.tiem.utk.edu/~gross/bioed/webmodules/aminoacid.htm) used for pseudocounts,
@@ -44,6 +50,8 @@ def position_weight_matrix(seqs, pseudoC=AAfreq):
 
 def frequencies(seqs):
     """Build counts matrix of a given set of sequences."""
+    from Bio import motifs
+
     return motifs.create(seqs, alphabet=AAlist).counts
 
 
@@ -64,6 +72,45 @@ def GenerateBinarySeqID(seqs):
     return res
 
 
+def AAlookup():
+    """Map ASCII codes of residues (either case) to their index in AAlist, 255 otherwise."""
+    lookup = np.full(256, 255, dtype=np.uint8)
+    for ii, aa in enumerate(AAlist):
+        lookup[ord(aa)] = lookup[ord(aa.lower())] = ii
+    return lookup
+
+
+def EncodeSeqs(seqs):
+    """Encode motifs as an (N, 11) uint8 array of residue indices into AAlist."""
+    lookup = AAlookup()
+    res = lookup[np.frombuffer("".join(str(seq) for seq in seqs).encode(), dtype=np.uint8)].reshape(len(seqs), -1)
+    assert np.all(res < len(AAlist)), "Unknown residue in motifs."
+    return res
+
+
+def DecodeSeqs(seqs):
+    """Convert residue-index encoded motifs back to strings."""
+    return ["".join(AAlist[aa] for aa in seq) for seq in seqs]
+
+
+def OneHotMotifs(seqs, nAA):
+    """Sparse (N, positions * nAA) one-hot encoding of residue-index encoded motifs."""
+    flat = seqs.astype(np.intp) + nAA * np.arange(seqs.shape[1])
+    indptr = np.arange(0, flat.size + 1, seqs.shape[1])
+    return csr_matrix((np.ones(flat.size), flat.ravel(), indptr), shape=(seqs.shape[0], nAA * seqs.shape[1]))
+
+
+@njit(parallel=True, cache=True)
+def gatherSum(seqs, probmats):
+    """Sum over positions of probmats[k, residue, position] for every peptide and cluster, with Numba JIT."""
+    out = np.zeros((seqs.shape[0], probmats.shape[0]))
+    for ii in prange(seqs.shape[0]):  # pylint: disable=not-an-iterable
+        for kk in range(probmats.shape[0]):
+            for pos in range(seqs.shape[1]):
+                out[ii, kk] += probmats[kk, seqs[ii, pos], pos]
+    return out
+
+
 def BackgroundSeqs(forseqs):
     """Build Background data set with the same proportion of pY, pT, and pS motifs as in the foreground set of sequences.
     Note this PsP data set contains 51976 pY, 226131 pS, 81321 pT
@@ -71,6 +118,11 @@ def BackgroundSeqs(forseqs):
     Phosphorylation_site_dataset.gz - Last mod: Wed Dec 04 14:56:35 EST 2019
     Cite: Hornbeck PV, Zhang B, Murray B, Kornhauser JM, Latham V, Skrzypek E PhosphoSitePlus, 2014: mutations,
     PTMs and recalibrations. Nucleic Acids Res. 2015 43:D512-20. PMID: 25514926"""
+    return [Seq(motif) for motif in DecodeSeqs(BackgroundEncoded(forseqs))]
+
+
+def BackgroundEncoded(forseqs):
+    """Same background set as BackgroundSeqs, as an (M, 11) array of residue indices."""
     # Get porportion of psite types in foreground set
     forw_pYn, forw_pSn, forw_pTn, _ = CountPsiteTypes(forseqs, 5)
     forw_tot = forw_pYn + forw_pSn + forw_pTn
@@ -79,13 +131,10 @@ def BackgroundSeqs(forseqs):
     pSf = forw_pSn / forw_tot
     pTf = forw_pTn / forw_tot
 
-    # Import backgroun sequences file
-    PsP = pd.read_csv("./msresist/data/Sequence_analysis/pX_dataset_PhosphoSitePlus2019.csv")
-    PsP = PsP[~PsP["SITE_+/-7_AA"].str.contains("_")]
-    PsP = PsP[~PsP["SITE_+/-7_AA"].str.contains("X")]
-    refseqs = list(PsP["SITE_+/-7_AA"])
-    len_bg = int(len(refseqs))
-    backg_pYn, _, _, _ = CountPsiteTypes(refseqs, 7)
+    # Import background sequences
+    PsP = PsPEncoded()
+    len_bg = int(PsP.shape[0])
+    backg_pYn = int(np.count_nonzero(PsP[:, -1] == ord("Y")))
 
     # Make sure there are enough pY peptides to meet proportions
     if backg_pYn >= len_bg * pYf:
@@ -101,8 +150,56 @@ def BackgroundSeqs(forseqs):
         pTn = int(tot_p * pTf)
 
     # Build background sequences
-    bg_seqs = BackgProportions(refseqs, pYn, pSn, pTn)
-    return bg_seqs
+    return BackgProportionsEncoded(pYn, pSn, pTn)
+
+
+def BackgroundPWM(forseqs, pseudoC=AAfreq):
+    """PWM of the background set, equal to position_weight_matrix(BackgroundSeqs(forseqs)) as a 20 x 11 array."""
+    seqs = BackgroundEncoded(forseqs)
+    counts = np.array([np.bincount(seqs[:, pos], minlength=256)[:len(AAlist)] for pos in range(seqs.shape[1])], dtype=float).T
+    counts += np.array([pseudoC[AA] for AA in AAlist])[:, np.newaxis]
+    return counts / np.sum(counts, axis=0)
+
+
+@lru_cache(maxsize=None)
+def BackgProportionsEncoded(pYn, pSn, pTn):
+    """Take the first pYn, pSn and pTn PsP motifs of each phosphoacceptor type, as BackgProportions does."""
+    PsP = PsPEncoded()
+    idx = np.concatenate([np.flatnonzero(PsP[:, -1] == ord(aa))[:n] for aa, n in (("Y", pYn), ("S", pSn), ("T", pTn))])
+    seqs = np.array(PsP[idx, :-1])
+    seqs.flags.writeable = False
+    return seqs
+
+
+@lru_cache(maxsize=None)
+def PsPEncoded():
+    """PhosphoSitePlus sites as an (M, 12) uint8 array: the 11-mer around the site encoded as residue indices,
+    followed by the phosphoacceptor ("Y", "S", "T", or 0 for other sites). It is built from the csv on first use,
+    saved next to it and memory-mapped afterwards; the cache is rebuilt if the csv is newer."""
+    csv, cache = PsPfile + ".csv", PsPfile + ".npy"
+
+    if not os.path.exists(cache) or os.path.getmtime(cache) < os.path.getmtime(csv):
+        PsP = pd.read_csv(csv)
+        PsP = PsP[~PsP["SITE_+/-7_AA"].str.contains("_")]
+        PsP = PsP[~PsP["SITE_+/-7_AA"].str.contains("X")]
+        refseqs = list(PsP["SITE_+/-7_AA"])
+
+        out = np.full((len(refseqs), 12), 255, dtype=np.uint8)
+        out[:, -1] = 0
+        lookup = AAlookup()
+        for ii, seq in enumerate(refseqs):
+            if seq[7] not in ["y", "t", "s"]:
+                continue
+            motif = str(seq)[7 - 5: 7 + 6]
+            assert len(motif) == 11, "Wrong sequence length. Sliced: %s, Full: %s" % (motif, seq)
+            out[ii, :-1] = lookup[np.frombuffer(motif.encode(), dtype=np.uint8)]
+            out[ii, -1] = ord(seq[7].upper())
+
+        tmp = "%s.%d.npy" % (PsPfile, os.getpid())
+        np.save(tmp, out)
+        os.replace(tmp, cache)
+
+    return np.load(cache, mmap_mode="r")
 
 
 def BackgProportions(refseqs, pYn, pSn, pTn):
@@ -129,16 +226,26 @@ def BackgProportions(refseqs, pYn, pSn, pTn):
     return y_seqs + s_seqs + t_seqs
 
 
+@lru_cache(maxsize=8)
+def BinomialBackground(seq, seqs):
+    """Background PWM and encoded motifs of a set of peptides, memoized on the sequence tuples so that every
+    Binomial built on the same peptides in this process (e.g. sklearn clones) shares one read-only copy."""
+    background = (BackgroundPWM(seq), EncodeSeqs(seqs))
+    for arr in background:
+        arr.flags.writeable = False
+    return background
+
+
 class Binomial(CustomDistribution):
-    """Create a binomial distance distribution compatible with pomegranate. """
+    """Create a binomial distance distribution compatible with pomegranate.
+    The background holds the 20 x 11 PWM of the background sequences and the (N, 11) encoded motifs. """
 
     def __init__(self, seq, seqs, SeqWeight, background=None):
         self.background = background
 
         if background is None:
             # Background sequences
-            background = position_weight_matrix(BackgroundSeqs(seq))
-            self.background = (np.array([background[AA] for AA in AAlist]), GenerateBinarySeqID(seqs))
+            self.background = BinomialBackground(tuple(seq), tuple(seqs))
 
         super().__init__(len(seqs))
         self.seq = seq
@@ -158,13 +265,24 @@ class Binomial(CustomDistribution):
 
     def from_summaries(self, inertia=0.0):
         """ Update the underlying distribution. No inertia used. """
-        k = np.dot(self.background[1].T, self.weightsIn).T
+        self.logWeights[:] = self.batch_logWeights(self.weightsIn[:, np.newaxis])[:, 0]
+
+    def encode(self, seqs):
+        """ Encode motifs the way this distribution stores them. """
+        return EncodeSeqs(seqs)
+
+    def batch_logWeights(self, weights, motifs=None):
+        """ Update all clusters at once from the (N, K) responsibilities and return the (N, K)
+        sequence log-likelihoods. Same as from_summaries run on each column.
+        If encoded motifs are given, score those peptides against the clusters instead. """
+        seqs = self.background[1]
+        k = (OneHotMotifs(seqs, len(AAlist)).T @ weights).T.reshape(-1, seqs.shape[1], len(AAlist)).transpose(0, 2, 1)
 
         # The counts must be positive, so check this
-        betaA = np.sum(self.weightsIn) - k
+        betaA = np.sum(weights, axis=0)[:, np.newaxis, np.newaxis] - k
         betaA = np.clip(betaA, 0.01, np.inf)
         probmat = sc.betainc(betaA, k + 1, 1 - self.background[0])
-        self.logWeights[:] = self.SeqWeight * np.log(np.tensordot(self.background[1], probmat, axes=2))
+        return self.SeqWeight * np.log(gatherSum(seqs if motifs is None else motifs, probmat))
 
 
 def unpackBinomial(seq, seqs, sw, lw, frozen):
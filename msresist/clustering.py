@@ -1,101 +1,185 @@
 """ Clustering functions. """
 
+import os
 import glob
-import itertools
 from copy import copy
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import numpy as np
 import pandas as pd
+from scipy.special import logsumexp
 from sklearn.base import BaseEstimator
 from sklearn.utils.validation import check_is_fitted
-from sklearn.manifold import MDS
-from sklearn.decomposition import PCA
-from Bio.Align import substitution_matrices
-from .expectation_maximization import EM_clustering_repeat
+from .expectation_maximization import EM_clustering_repeat, DiagonalMixture, mixture_from_gmm, gaussian_loglik, seq_loglik
 from .motifs import ForegroundSeqs
-from .binomial import Binomial, AAlist, BackgroundSeqs, frequencies
-from .pam250 import PAM250, fixedMotif
+from .binomial import Binomial, AAlist, BackgroundEncoded, EncodeSeqs, OneHotMotifs
+from .pam250 import PAM250, fixedMotif, EncodePam250
 
 
 # pylint: disable=W0201
 
+PSPLpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/PSPL")
+
+# Positions normalized across residues in the cluster PSSMs; P0 holds the phosphoacceptor
+POSITIONS = [0, 1, 2, 3, 4, 6, 7, 8, 9, 10]
+
 
 class MassSpecClustering(BaseEstimator):
     """ Cluster peptides by both sequence similarity and data behavior following an
     expectation-maximization algorithm. SeqWeight specifies which method's expectation step
-    should have a larger effect on the peptide assignment. """
+    should have a larger effect on the peptide assignment. engine selects either the pomegranate
+    mixture model or the vectorized numpy implementation of the same EM. n_jobs > 1 runs the EM
+    restarts in a process pool. A precomputed sequence background can be passed to skip its computation. """
 
-    def __init__(self, info, ncl, SeqWeight, distance_method, background=False, pre_motifs=False, verbose=False):
+    def __init__(self, info, ncl, SeqWeight, distance_method, background=False, pre_motifs=False, verbose=False, engine="pomegranate", n_jobs=1):
         self.info = info
         self.ncl = ncl
         self.SeqWeight = SeqWeight
         self.distance_method = distance_method
         self.verbose = verbose
+        self.engine = engine
+        self.n_jobs = n_jobs
+
+        self.pre_motifs = pre_motifs
+        self.background = background
+        self.dist = self.build_dist(None if isinstance(background, bool) else background)
 
-        seqs = [s.upper() for s in info["Sequence"]]
+    def build_dist(self, background=None):
+        """Sequence distribution(s) for the current info, SeqWeight and distance_method. Sequence backgrounds are
+        memoized per process, so rebuilding after a SeqWeight change only recomputes the weighted log-probabilities."""
+        seqs = [s.upper() for s in self.info["Sequence"]]
 
-        if distance_method == "PAM250":
-            self.dist = PAM250(seqs, SeqWeight)
+        if self.distance_method == "PAM250":
+            return PAM250(seqs, self.SeqWeight, background)
+
+        if self.distance_method == "PAM250_fixed":
+            from Bio.Align import substitution_matrices
 
-        elif distance_method == "PAM250_fixed":
-            assert len(pre_motifs) <= ncl
+            assert len(self.pre_motifs) <= self.ncl
             pam250 = substitution_matrices.load("PAM250")
             seqsArr = np.array([[pam250.alphabet.find(aa) for aa in seq] for seq in seqs], dtype=np.intp)
             seqsArr = np.delete(seqsArr, [5, 10], axis=1)  # Delelte P0 and P+5 (not in PSPL motifs)
-            PSPLs = PSPLdict()
+            PSPLs = PSPLlibrary()
 
-            self.pre_motifs = pre_motifs
-            self.dist = [fixedMotif(seqsArr, PSPLs[mm], SeqWeight) for mm in pre_motifs]
+            dist = [fixedMotif(seqsArr, PSPLs[mm], self.SeqWeight) for mm in self.pre_motifs]
 
-            while len(self.dist) < ncl:
-                self.dist.append(Binomial(info["Sequence"], seqs, SeqWeight))
+            if len(dist) < self.ncl:
+                binom = Binomial(self.info["Sequence"], seqs, self.SeqWeight, background)
+                while len(dist) < self.ncl:
+                    dist.append(binom.copy())
+            return dist
 
-        elif distance_method == "Binomial":
-            self.dist = Binomial(info["Sequence"], seqs, SeqWeight)
+        if self.distance_method == "Binomial":
+            return Binomial(self.info["Sequence"], seqs, self.SeqWeight, background)
+
+        return None
 
     def fit(self, X, y=None, nRepeats=1):
         """Compute EM clustering"""
-        self.avgScores_, self.scores_, self.seq_scores_, self.gmm_ = EM_clustering_repeat(nRepeats, X, self.info, self.ncl, self.dist, None, self.verbose)
+        self.avgScores_, self.scores_, self.seq_scores_, self.gmm_ = EM_clustering_repeat(nRepeats, X, self.info, self.ncl, self.dist, None, self.verbose, engine=self.engine, n_jobs=self.n_jobs)
 
         return self
 
+    def save(self, path):
+        """Save the fitted model to an npz archive of plain arrays: mixture parameters, sequence logWeights,
+        responsibilities, peptide annotations and the encoded sequence background."""
+        gmm = self.mixture()
+
+        arrays = {
+            "means": gmm.means,
+            "variances": gmm.variances,
+            "weights": gmm.weights,
+            "logWeights": gmm.logWeights,
+            "scores": self.scores_,
+            "avgScore": self.avgScores_,
+            "ncl": self.ncl,
+            "SeqWeight": self.SeqWeight,
+            "distance_method": self.distance_method,
+            "engine": self.engine,
+            "info_columns": np.array(self.info.columns, dtype=str),
+            "info_dtypes": np.array([str(dtype) for dtype in self.info.dtypes], dtype=str),
+            "info_index": np.asarray(self.info.index) if self.info.index.dtype.kind in "iuf" else np.array(self.info.index, dtype=str),
+        }
+        # Each annotation column keeps its dtype: numeric columns as they are, anything else as strings plus a NaN mask
+        for ii, (_, col) in enumerate(self.info.items()):
+            if isinstance(col.dtype, np.dtype) and col.dtype.kind in "biuf":
+                arrays["info_col%d" % ii] = col.values
+            else:
+                missing = pd.isna(col).values
+                arrays["info_col%d" % ii] = np.where(missing, "", col.astype(object).values).astype(str)
+                arrays["info_nan%d" % ii] = missing
+
+        dists = self.dist if isinstance(self.dist, list) else [self.dist]
+        seqDist = [dd for dd in dists if not isinstance(dd, fixedMotif)]
+        if seqDist:
+            background = seqDist[0].background
+            if not isinstance(background, tuple):
+                background = EncodePam250(seqDist[0].seqs)  # store the factorized PAM250 background instead of the N x N matrix
+            for ii, bg in enumerate(background):
+                arrays["background%d" % ii] = bg
+        if self.distance_method == "PAM250_fixed":
+            arrays["pre_motifs"] = np.array(self.pre_motifs, dtype=str)
+
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load a model written by save. The sequence background is read from the file, not recomputed."""
+        with np.load(path, allow_pickle=False) as data:
+            info = LoadInfo(data)
+            background = tuple(data["background%d" % ii] for ii in range(2) if "background%d" % ii in data) or False
+            pre_motifs = list(data["pre_motifs"]) if "pre_motifs" in data else False
+
+            model = cls(info, int(data["ncl"]), data["SeqWeight"].item(), str(data["distance_method"]), background=background, pre_motifs=pre_motifs, engine=str(data["engine"]))
+            model.gmm_ = DiagonalMixture(data["means"], data["variances"], data["weights"], data["logWeights"])
+            model.scores_ = data["scores"]
+            model.seq_scores_ = np.exp(model.gmm_.logWeights)
+            model.avgScores_ = data["avgScore"].item()
+
+        return model
+
     def wins(self, X):
         """Find similarity of fitted model to data and sequence models"""
         check_is_fitted(self, ["scores_", "seq_scores_", "gmm_"])
 
         if self.distance_method == "PAM250_fixed":
-            wDist = [dd.copy() for dd in self.dist]
-            for dd in wDist:
+            dataDist = [dd.copy() for dd in self.dist]
+            seqDist = [dd.copy() for dd in self.dist]
+            for dd, sd in zip(dataDist, seqDist):
                 dd.SeqWeight = 0.0
+                sd.SeqWeight = 10.0
         else:
-            wDist = self.dist.copy()
-            wDist.SeqWeight = 0.0
+            dataDist = self.dist.copy()
+            seqDist = self.dist.copy()
+            dataDist.SeqWeight = 0.0
+            seqDist.SeqWeight = 10.0
 
-        data_model = EM_clustering_repeat(3, X, self.info, self.ncl, wDist)[1]
+        # Refit one after the other; each refit spreads its restarts over its own process pool
+        data_model, seq_model = [EM_clustering_repeat(3, X, self.info, self.ncl, dd, engine=self.engine, n_jobs=self.n_jobs)[1] for dd in (dataDist, seqDist)]
 
-        if self.distance_method == "PAM250_fixed":
-            for dd in wDist:
-                dd.SeqWeight = 10.0
-        else:
-            wDist.SeqWeight = 10.0
-
-        seq_model = EM_clustering_repeat(3, X, self.info, self.ncl, wDist)[1]
-
-        dataDist = np.linalg.norm(self.scores_ - data_model)
-        seqDist = np.linalg.norm(self.scores_ - seq_model)
-
-        for i in itertools.permutations(np.arange(self.ncl)):
-            dataDistTemp = np.linalg.norm(self.scores_ - data_model[:, i])
-            seqDistTemp = np.linalg.norm(self.scores_ - seq_model[:, i])
-
-            dataDist = np.minimum(dataDist, dataDistTemp)
-            seqDist = np.minimum(seqDist, seqDistTemp)
+        dataDist = np.linalg.norm(self.scores_ - data_model[:, align_clusters(self.scores_, data_model)])
+        seqDist = np.linalg.norm(self.scores_ - seq_model[:, align_clusters(self.scores_, seq_model)])
 
         return (dataDist, seqDist)
 
-    def transform(self):
-        """Calculate cluster averages"""
+    def transform(self, X=None):
+        """Calculate cluster averages. Given samples X laid out as in fit, each cluster average is instead the
+        responsibility-weighted mean of those samples' peptides, ignoring missing values; this is what a
+        scikit-learn Pipeline calls for both training and held-out samples. A sample with no observed peptides in a
+        cluster gets that cluster's average fitted center."""
         check_is_fitted(self, ["gmm_"])
 
+        if X is not None:
+            d = np.array(X, dtype=float)
+            observed = np.isfinite(d)
+            num = np.dot(np.where(observed, d, 0.0), self.scores_)
+            den = np.dot(observed, self.scores_)
+            fallback = np.broadcast_to(np.mean(self.transform(), axis=0), num.shape)
+            return np.divide(num, den, out=np.array(fallback), where=den > 0)
+
+        if isinstance(self.gmm_, DiagonalMixture):
+            return self.gmm_.means.T.copy()
+
         centers = np.zeros((self.ncl, self.gmm_.distributions[0].d - 1))
 
         for ii, distClust in enumerate(self.gmm_.distributions):
@@ -111,77 +195,91 @@ class MassSpecClustering(BaseEstimator):
         return np.argmax(self.scores_, axis=1) + 1
 
     def pssms(self, PsP_background=False, erk_control=False):
-        """Compute position-specific scoring matrix of each cluster.
+        """Compute position-specific scoring matrix of each cluster as a (ncl, 20, 11) array.
         Note, to normalize by amino acid frequency this uses either
         all the sequences in the data set or a collection of random MS phosphosites in PhosphoSitePlus."""
-        pssms = []
+        check_is_fitted(self, ["scores_"])
+        seqs = EncodeSeqs(self.info["Sequence"])
         if PsP_background:
-            bg_seqs = BackgroundSeqs(self.info["Sequence"])
-            back_pssm = compute_control_pssm(bg_seqs)
+            back_pssm = control_pssm(BackgroundEncoded(self.info["Sequence"]))
         else:
-            back_pssm = np.zeros((len(AAlist), 11), dtype=float)
-        for ii in range(self.ncl):
-            pssm = np.zeros((len(AAlist), 11), dtype=float)
-            for jj, seq in enumerate(self.info["Sequence"]):
-                seq = seq.upper()
-                for kk, aa in enumerate(seq):
-                    pssm[AAlist.index(aa), kk] += self.scores_[jj, ii]
-                    if ii == 0 and not PsP_background:
-                        back_pssm[AAlist.index(aa), kk] += 1.0
-
-            # Normalize by position across residues and remove negative outliers
-            for pos in range(pssm.shape[1]):
-                if pos == 5:
-                    continue
-                pssm[:, pos] /= np.mean(pssm[:, pos])
-                if ii == 0 and not PsP_background:
-                    back_pssm[:, pos] /= np.mean(back_pssm[:, pos])
-            pssm = np.ma.log2(pssm)
-            pssm = pssm.filled(0)
-            if ii == 0 and not PsP_background:
-                back_pssm = np.ma.log2(back_pssm)
-                back_pssm = back_pssm.filled(0)
-            pssm -= back_pssm.copy()
-            pssm = np.nan_to_num(pssm)
-            pssm = pd.DataFrame(pssm)
-            pssm.index = AAlist
-
-            # Normalize phosphoacceptor position to frequency
-            df = pd.DataFrame(self.info["Sequence"].str.upper())
-            df["Cluster"] = self.labels()
-            clSeq = df[df["Cluster"] == ii + 1]["Sequence"]
-            clSeq = pd.DataFrame(frequencies(clSeq)).T
-            tm = np.mean([clSeq.loc["S", 5], clSeq.loc["T", 5], clSeq.loc["Y", 5]])
-            for p_site in ["S", "T", "Y"]:
-                pssm.loc[p_site, 5] = np.log2(clSeq.loc[p_site, 5] / tm)
-
-            pssms.append(np.clip(pssm, a_min=0, a_max=3))
-
-        return pssms
+            back_pssm = control_pssm(seqs, POSITIONS)
+
+        # Residue counts weighted by cluster responsibilities; normalize by position across residues
+        pssms = PositionCounts(seqs, self.scores_)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pssms[:, :, POSITIONS] /= np.mean(pssms[:, :, POSITIONS], axis=1, keepdims=True)
+            pssms = np.nan_to_num(np.ma.log2(pssms).filled(0) - back_pssm)
+
+            # Normalize phosphoacceptor position to frequency among the peptides assigned to each cluster
+            pAcceptors = [AAlist.index(p_site) for p_site in ["S", "T", "Y"]]
+            clSeq = PositionCounts(seqs, np.eye(self.ncl)[self.labels() - 1])[:, pAcceptors, 5]
+            pssms[:, pAcceptors, 5] = np.nan_to_num(np.log2(clSeq / np.mean(clSeq, axis=1, keepdims=True)))
+
+        return np.clip(pssms, a_min=0, a_max=3)
+
+    def pssm_frames(self, PsP_background=False):
+        """PSSMs as a list of 20 x 11 DataFrames indexed by residue, for plotting."""
+        return [pd.DataFrame(pssm, index=AAlist) for pssm in self.pssms(PsP_background=PsP_background)]
 
     def predict_UpstreamKinases(self, PsP_background=False, additional_pssms=False):
         """Compute matrix-matrix similarity between kinase specificity profiles and cluster PSSMs to identify upstream kinases regulating clusters."""
-        PSPLs = PSPLdict()
+        PSPLs = PSPLlibrary()
         PSSMs = self.pssms(PsP_background=True)
 
         # Optionally add external pssms
         if not isinstance(additional_pssms, bool):
-            PSSMs += additional_pssms
-        PSSMs = [np.delete(np.array(list(np.array(mat))), [5, 10], axis=1) for mat in PSSMs]  # Remove P0 and P+5 from pssms
+            PSSMs = np.concatenate([PSSMs, np.array([np.array(mat) for mat in additional_pssms])])
+        PSSMs = np.delete(PSSMs, [5, 10], axis=2)  # Remove P0 and P+5 from pssms
 
-        a = np.zeros((len(PSPLs), len(PSSMs)))
-        for ii, spec_profile in enumerate(PSPLs.values()):
-            for jj, pssm in enumerate(PSSMs):
-                a[ii, jj] = np.linalg.norm(pssm - spec_profile)
+        a = np.linalg.norm(PSPLs.profiles[:, np.newaxis] - PSSMs[np.newaxis], axis=(2, 3))
 
         table = pd.DataFrame(a)
-        table.insert(0, "Kinase", list(PSPLdict().keys()))
+        table.insert(0, "Kinase", PSPLs.names)
         return table
 
-    def predict(self):
-        """Provided the current model parameters, predict the cluster each peptide belongs to"""
-        check_is_fitted(self, ["scores_"])
-        return np.argmax(self.scores_, axis=1)
+    def UpstreamKinases_pvalues(self, nPermutations=1000, seed=None, n_jobs=1):
+        """Empirical p-value of each kinase-cluster distance from predict_UpstreamKinases against a null of
+        PSSMs with permuted positions: the fraction of permutations at least as close to the kinase profile."""
+        PSPLs = PSPLlibrary()
+        PSSMs = np.delete(self.pssms(PsP_background=True), [5, 10], axis=2)  # Remove P0 and P+5 from pssms
+
+        observed = np.linalg.norm(PSPLs.profiles[:, np.newaxis] - PSSMs[np.newaxis], axis=(2, 3))
+        null = KinaseDistanceNull(PSPLs.profiles, PSSMs, nPermutations, seed, n_jobs)
+        pvalues = (1 + np.sum(null <= observed[:, :, np.newaxis], axis=2)) / (1 + nPermutations)
+
+        table = pd.DataFrame(pvalues)
+        table.insert(0, "Kinase", PSPLs.names)
+        return table
+
+    def predict_proba(self, X_new, info_new, chunksize=10000):
+        """Cluster probabilities of new peptides under the fitted model, without refitting. X_new and info_new
+        are laid out as in fit. Peptides are scored in chunks; missing values don't contribute to the likelihood."""
+        check_is_fitted(self, ["gmm_", "scores_"])
+        gmm = self.mixture()
+        d = np.array(X_new, dtype=float).T
+        seqs = list(info_new["Sequence"])
+
+        scores = np.empty((d.shape[0], self.ncl))
+        for start in range(0, d.shape[0], chunksize):
+            end = start + chunksize
+            logp = gaussian_loglik(d[start:end], gmm.means, gmm.variances) + seq_loglik(self.dist, self.scores_, seqs[start:end]) + np.log(gmm.weights)
+            scores[start:end] = np.exp(logp - logsumexp(logp, axis=1)[:, np.newaxis])
+
+        return scores
+
+    def predict(self, X_new=None, info_new=None):
+        """Provided the current model parameters, predict the cluster each peptide belongs to.
+        Without arguments this is the training assignment; otherwise new peptides are scored with predict_proba."""
+        if X_new is None:
+            check_is_fitted(self, ["scores_"])
+            return np.argmax(self.scores_, axis=1)
+        return np.argmax(self.predict_proba(X_new, info_new), axis=1)
+
+    def mixture(self):
+        """Fitted data model parameters as a DiagonalMixture, whichever engine was used."""
+        check_is_fitted(self, ["gmm_"])
+        return self.gmm_ if isinstance(self.gmm_, DiagonalMixture) else mixture_from_gmm(self.gmm_)
 
     def score(self):
         """ Generate score of the fitting. """
@@ -194,23 +292,99 @@ class MassSpecClustering(BaseEstimator):
             "info": self.info,
             "ncl": self.ncl,
             "SeqWeight": self.SeqWeight,
-            "distance_method": self.distance_method
+            "distance_method": self.distance_method,
+            "engine": self.engine,
+            "n_jobs": self.n_jobs
         }
 
     def set_params(self, **parameters):
-        """Necessary to make this estimator scikit learn-compatible"""
+        """Necessary to make this estimator scikit learn-compatible. The sequence distributions are rebuilt when a
+        parameter they depend on changes, e.g. SeqWeight during a grid search."""
         for parameter, value in parameters.items():
             setattr(self, parameter, value)
+        if "info" in parameters:
+            self.background = False  # the background encodes the previous peptides
+        if {"info", "ncl", "SeqWeight", "distance_method"} & parameters.keys():
+            background = getattr(self, "background", False)
+            self.dist = self.build_dist(None if isinstance(background, bool) else background)
         return self
 
 
+def LoadInfo(data):
+    """Peptide annotations stored by MassSpecClustering.save, with their original dtypes."""
+    columns = list(data["info_columns"])
+    if "info_values" in data:  # files written before the annotations were stored by column
+        return pd.DataFrame(data["info_values"], columns=columns, index=data["info_index"]).astype(object)
+
+    cols = {}
+    for ii, dtype in enumerate(data["info_dtypes"]):
+        col = pd.Series(data["info_col%d" % ii])
+        if "info_nan%d" % ii in data:
+            col = col.astype(object).mask(data["info_nan%d" % ii], np.nan).astype(dtype)
+        cols[ii] = col
+    info = pd.DataFrame(cols)
+    info.columns = columns
+    info.index = data["info_index"]
+    return info
+
+
+def align_clusters(scores_a, scores_b):
+    """Find the column order of scores_b that best matches the clusters of scores_a, i.e. the permutation
+    minimizing the Frobenius distance between both responsibility matrices, as a linear assignment problem."""
+    from scipy.optimize import linear_sum_assignment
+
+    _, perm = linear_sum_assignment(np.dot(scores_a.T, scores_b), maximize=True)
+    return perm
+
+
+class KinaseLibrary:
+    """Kinase specificity profiles packed as a contiguous (n_kinases, 20, 9) array (P0 and P+5 excluded), with
+    the kinase names, an index from name to row, and each kinase's phosphoacceptor type."""
+
+    def __init__(self, names, profiles):
+        self.names = list(names)
+        self.profiles = profiles
+        self.index = {name: ii for ii, name in enumerate(self.names)}
+        self.phosphoacceptors = [KinToPhosphotypeDict.get(name, "") for name in self.names]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name):
+        return self.profiles[self.index[name]]
+
+
+@lru_cache(maxsize=None)
+def PSPLlibrary():
+    """Load the kinase specificity profiles once per process. They are parsed from the csv files in data/PSPL on
+    first use and saved next to them; the cache is rebuilt if any csv is newer."""
+    csvs = sorted(glob.glob(os.path.join(PSPLpath, "*.csv")))
+    cache = os.path.join(PSPLpath, "PSPL.npz")
+
+    if not os.path.exists(cache) or os.path.getmtime(cache) < max(os.path.getmtime(csv) for csv in csvs):
+        pspl_dict = ParsePSPLs(csvs)
+        tmp = "%s.%d.npz" % (cache[:-4], os.getpid())
+        np.savez(tmp, names=np.array(list(pspl_dict.keys())), profiles=np.array(list(pspl_dict.values())))
+        os.replace(tmp, cache)
+
+    with np.load(cache) as data:
+        profiles = np.ascontiguousarray(data["profiles"])
+        profiles.flags.writeable = False
+        return KinaseLibrary(data["names"], profiles)
+
+
 def PSPLdict():
     """Generate dictionary with kinase name-specificity profile pairs"""
+    library = PSPLlibrary()
+    return dict(zip(library.names, library.profiles))
+
+
+def ParsePSPLs(csvs):
+    """Parse the individual kinase profiles and the NetPhorest PSPL results into a dictionary."""
     pspl_dict = {}
     # individual files
-    PSPLs = glob.glob("./msresist/data/PSPL/*.csv")
-    for sp in PSPLs:
-        if sp == "./msresist/data/PSPL/pssm_data.csv":
+    for sp in csvs:
+        if os.path.basename(sp) == "pssm_data.csv":
             continue
         sp_mat = pd.read_csv(sp).sort_values(by="Unnamed: 0")
 
@@ -224,10 +398,10 @@ def PSPLdict():
         if np.all(sp_mat >= 0):
             sp_mat = np.log2(sp_mat)
 
-        pspl_dict[sp.split("PSPL/")[1].split(".csv")[0]] = sp_mat
+        pspl_dict[os.path.basename(sp)[:-len(".csv")]] = sp_mat
 
     # NetPhores PSPL results
-    f = pd.read_csv("msresist/data/PSPL/pssm_data.csv", header=None)
+    f = pd.read_csv(os.path.join(PSPLpath, "pssm_data.csv"), header=None)
     matIDX = [np.arange(16) + i for i in range(0, f.shape[0], 16)]
     for ii in matIDX:
         kin = f.iloc[ii[0], 0]
@@ -242,16 +416,63 @@ def PSPLdict():
     return pspl_dict
 
 
+def PermutePositions(pssms, nPermutations, rng=None):
+    """Stack nPermutations copies of each (20, positions) PSSM with its positions shuffled, as a
+    (n_pssms, nPermutations, 20, positions) array."""
+    perms = PositionPermutations(pssms.shape[0], nPermutations, pssms.shape[2], rng)
+    return np.take_along_axis(pssms[:, np.newaxis], perms[:, :, np.newaxis], axis=3)
+
+
+def PositionPermutations(nPSSMs, nPermutations, nPositions, rng=None):
+    """Independent permutations of the positions, as an (nPSSMs, nPermutations, nPositions) index array."""
+    rng = np.random.default_rng(rng)
+    return rng.permuted(np.broadcast_to(np.arange(nPositions), (nPSSMs, nPermutations, nPositions)), axis=2)
+
+
+def KinaseDistanceNull(profiles, pssms, nPermutations=1000, seed=None, n_jobs=1, blocksize=256):
+    """Frobenius distances between every kinase profile and position-permuted versions of every PSSM, as an
+    (n_kinases, n_pssms, nPermutations) array. The permutations are drawn in blocks, split across a process pool
+    when n_jobs > 1; each block has its own seed spawned from seed, so results don't depend on n_jobs."""
+    # Squared distance between each kinase position and each PSSM position; a permuted distance sums a gather
+    colDist = np.sum(np.square(profiles[:, np.newaxis, :, :, np.newaxis] - pssms[np.newaxis, :, :, np.newaxis, :]), axis=2)
+
+    sizes = [len(block) for block in np.array_split(np.arange(nPermutations), -(-nPermutations // blocksize))]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(sizes))) as executor:
+            blocks = list(executor.map(KinaseNullBlock, [colDist] * len(sizes), sizes, seeds))
+    else:
+        blocks = [KinaseNullBlock(colDist, size, sd) for size, sd in zip(sizes, seeds)]
+
+    return np.concatenate(blocks, axis=2)
+
+
+def KinaseNullBlock(colDist, nPermutations, seed):
+    """One block of KinaseDistanceNull from the (n_kinases, n_pssms, positions, positions) position distances."""
+    nPositions = colDist.shape[2]
+    perms = PositionPermutations(colDist.shape[1], nPermutations, nPositions, seed)
+    gathered = colDist[:, np.arange(colDist.shape[1])[:, np.newaxis, np.newaxis], np.arange(nPositions), perms]
+    return np.sqrt(np.sum(gathered, axis=3))
+
+
 def compute_control_pssm(bg_sequences):
     """Generate PSSM."""
-    back_pssm = np.zeros((len(AAlist), 11), dtype=float)
-    for _, seq in enumerate(bg_sequences):
-        for kk, aa in enumerate(seq):
-            back_pssm[AAlist.index(aa), kk] += 1.0
-    for pos in range(back_pssm.shape[1]):
-        back_pssm[:, pos] /= np.mean(back_pssm[:, pos])
-    back_pssm = np.ma.log2(back_pssm)
-    return back_pssm.filled(0)
+    return control_pssm(EncodeSeqs(bg_sequences))
+
+
+def control_pssm(seqs, positions=slice(None)):
+    """Log2 PSSM of encoded background motifs, the given positions normalized by their mean across residues."""
+    back_pssm = PositionCounts(seqs, np.ones((seqs.shape[0], 1)))[0]
+    back_pssm[:, positions] /= np.mean(back_pssm[:, positions], axis=0)
+    return np.ma.log2(back_pssm).filled(0)
+
+
+def PositionCounts(seqs, weights):
+    """Residue counts at each position of encoded motifs, weighted by each column of the (N, K) weights, as a
+    (K, 20, positions) array."""
+    counts = OneHotMotifs(seqs, len(AAlist)).T.dot(weights).T
+    return counts.reshape(weights.shape[1], seqs.shape[1], len(AAlist)).transpose(0, 2, 1)
 
 
 KinToPhosphotypeDict = {
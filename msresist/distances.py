@@ -1,14 +1,16 @@
 """Creates plots to visualize cell clustering data"""
-import glob
 import math
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from astropy.stats import RipleysKEstimator
+from scipy.spatial import cKDTree
+from .spatial import RipleysK, poisson as PoissonK
+from .phenotypes import ImageFile, ImageTimes
 
 
 def PlotSingleDistances(folder, extension, ax, log=False):
     """Plots boxplot of distance to closest cell give ImageJ data, with or without log transformation"""
+    import seaborn as sns
+
     times = GetTimes(folder, extension)
     file_frame = pd.concat(Generate_dfs(folder, extension, times))
     if log:
@@ -27,22 +29,14 @@ def PlotSingleDistances(folder, extension, ax, log=False):
 
 def GetTimes(folder, extension):
     """Takes in a folder and extension in correct format and returns list of times"""
-    filenames = glob.glob("msresist/data/Phenotypic_data/Distances/" + folder + "/Results_" + extension + "*.csv")
-    filename_prefix = "msresist/data/Phenotypic_data/Distances/" + folder + "/Results_" + extension + "_"
-    filename_suffix = ".csv"
-    times = []
-    for file in filenames:
-        time = int(file[len(filename_prefix): -len(filename_suffix)])
-        times.append(time)
-    times = sorted(times)
-    return times
+    return ImageTimes(folder, extension)
 
 
 def Generate_dfs(folder, extension, times):
     """Generates dfs of the data at each time point with an added column for time"""
     file_list = []
     for time in times:
-        file = pd.read_csv("msresist/data/Phenotypic_data/Distances/" + folder + "/Results_" + extension + "_" + str(time) + ".csv")
+        file = ImageFile(folder, extension, time)
         file["Time"] = time
         file_list.append(file)
     return file_list
@@ -51,21 +45,9 @@ def Generate_dfs(folder, extension, times):
 def Calculate_closest(file_list, n=(1, 3)):
     """Calculates distances to nearby cells and returns as dataframe ready to plot"""
     distances_by_time = []
-    for idx, file in enumerate(file_list):
+    shortest = BatchNearestDistances([file.loc[:, "X":"Y"].values for file in file_list], n)
+    for idx, shortest_n_distances in enumerate(shortest):
         distances_df = pd.DataFrame()
-        points = file.loc[:, "X":"Y"]
-        # shortest_n_distances_lists = []
-        shortest_n_distances = []
-        for origin_cell in np.arange(points.shape[0]):
-            distances = []
-            x1, y1 = points.iloc[origin_cell, :]
-            for other_cell in np.arange(points.shape[0]):
-                x2, y2 = points.iloc[other_cell, :]
-                distance = abs(math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2))
-                distances.append(distance)
-            distances = sorted(distances)
-            # shortest_n_distances_lists.append(distances[1:(n+1)])
-            shortest_n_distances.extend(distances[n[0]: (n[1] + 1)])
         distances_df["Distances"] = shortest_n_distances
         distances_df["Time"] = idx * 3
         distances_by_time.append(distances_df)
@@ -74,6 +56,8 @@ def Calculate_closest(file_list, n=(1, 3)):
 
 def PlotClosestN(folder, extension, ax, log=False, cells=(1, 3)):
     """Plots specified range of nearby cells as boxplots with or without log transformation"""
+    import seaborn as sns
+
     times = GetTimes(folder, extension)
     file_list = Generate_dfs(folder, extension, times)
     plotting_frame = Calculate_closest(file_list, cells)
@@ -93,6 +77,8 @@ def PlotClosestN(folder, extension, ax, log=False, cells=(1, 3)):
 
 def PlotNhrsdistances(folder, mutants, treatments, replicates, ax, log=False, logmean=False, cells=(1, 3)):
     """Creates either raw/log grouped boxplot or log pointplot for distances to cells depending on log and logmean variables for range of nearby cells"""
+    import seaborn as sns
+
     to_plot = Distances_import(folder, mutants, treatments, replicates, cells, logbool=False)
     if log:
         logs = []
@@ -109,10 +95,11 @@ def PlotNhrsdistances(folder, mutants, treatments, replicates, ax, log=False, lo
         # b = sns.swarmplot(x='Mutant', y='Distances', hue='Condition', data=to_plot, dodge=True, ax=ax)
 
 
-def calculatedistances(file, mutant, treatment, replicate, cells=(1, 3)):
-    """Calculates distances to range of other cells for a given mutant, treatment, and condition"""
+def calculatedistances(file, mutant, treatment, replicate, cells=(1, 3), shortest=None):
+    """Calculates distances to range of other cells for a given mutant, treatment, and condition.
+    shortest optionally passes the (distances, count) output of shortest_distances computed in a batch."""
     distances_df = pd.DataFrame()
-    shortest_n_distances, _ = shortest_distances(file, cells)
+    shortest_n_distances, _ = shortest_distances(file, cells) if shortest is None else shortest
     distances_df["Distances"] = shortest_n_distances
     distances_df["Mutant"] = mutant
     if replicate != 1:
@@ -125,6 +112,8 @@ def calculatedistances(file, mutant, treatment, replicate, cells=(1, 3)):
 def Plot_Logmean(folder, mutants, treatments, replicates, ax, vs_count=False, cells=(1, 3)):
     """Plots the log mean distance to neighbors by mutant and condition as given by cells argument.
     Will plot vs number of cells in image if vs_count is True"""
+    import seaborn as sns
+
     to_plot = Distances_import(folder, mutants, treatments, replicates, cells, logbool=True, count_bool=vs_count)
     if vs_count:
         sns.scatterplot(x="Cells", y="Log_Mean_Distances", hue="Condition", style="Condition", data=to_plot, ax=ax)
@@ -134,12 +123,10 @@ def Plot_Logmean(folder, mutants, treatments, replicates, ax, vs_count=False, ce
         sns.pointplot(x="Mutant", y="Log_Mean_Distances", hue="Condition", data=to_plot, ci=68, join=False, dodge=0.25, ax=ax)
 
 
-def calculatedistances_logmean(file, mutant, treatment, vs_count, cells=(1, 3)):
+def calculatedistances_logmean(file, mutant, treatment, vs_count, cells=(1, 3), shortest=None):
     """Calculates the average log distance to neighbors as defined by the cells argument and returns as a DataFrame in proper plotting format"""
-    shortest_n_distances, count = shortest_distances(file, cells)
-    logs = []
-    for length in shortest_n_distances:
-        logs.append(math.log(length))
+    shortest_n_distances, count = shortest_distances(file, cells) if shortest is None else shortest
+    logs = np.log(shortest_n_distances)
     if vs_count:
         distances_df = {"Log_Mean_Distances": [np.mean(logs)], "Cells": [count], "Condition": [treatment], "Mutant": [mutant]}
     else:
@@ -150,58 +137,59 @@ def calculatedistances_logmean(file, mutant, treatment, vs_count, cells=(1, 3)):
 
 def Distances_import(folder_name, mutant_list, treatment_list, replicate_number, cell_tuple, logbool, count_bool=None):
     """Imports specific files for the distance based plots, calculates distances, and returns a plottable df of distances"""
-    dfs = []
+    keys, point_sets = [], []
     for mutant in mutant_list:
-        mut_frames = []
         for treatment in treatment_list:
             for replicate in range(1, replicate_number + 1):
-                if replicate != 1:
-                    file = pd.read_csv("msresist/data/Phenotypic_data/Distances/" + folder_name + "/Results_" + mutant + treatment + str(replicate) + ".csv")
-                else:
-                    file = pd.read_csv("msresist/data/Phenotypic_data/Distances/" + folder_name + "/Results_" + mutant + treatment + ".csv")
-                if logbool:
-                    distances = calculatedistances_logmean(file, mutant, treatment, count_bool, cell_tuple)
-                else:
-                    distances = calculatedistances(file, mutant, treatment, replicate, cell_tuple)
-                mut_frames.append(distances)
-        mut_frame = pd.concat(mut_frames)
-        dfs.append(mut_frame)
+                file = ImageFile(folder_name, mutant + treatment + (str(replicate) if replicate != 1 else ""))
+                keys.append((mutant, treatment, replicate))
+                point_sets.append(file.loc[:, "X":"Y"].values)
+    shortest = BatchNearestDistances(point_sets, cell_tuple)
+
+    dfs = []
+    for (mutant, treatment, replicate), points, shortest_n_distances in zip(keys, point_sets, shortest):
+        if logbool:
+            distances = calculatedistances_logmean(None, mutant, treatment, count_bool, cell_tuple, (shortest_n_distances, points.shape[0]))
+        else:
+            distances = calculatedistances(None, mutant, treatment, replicate, cell_tuple, (shortest_n_distances, points.shape[0]))
+        dfs.append(distances)
     to_plot = pd.concat(dfs)
     return to_plot
 
 
 def shortest_distances(file_df, cell_tuple):
     """calculates distances for a specific file and cell neighbors set"""
-    points = file_df.loc[:, "X":"Y"]
-    shortest_n_distances = []
-    for origin_cell in np.arange(points.shape[0]):
-        distances = []
-        x1, y1 = points.iloc[origin_cell, :]
-        for other_cell in np.arange(points.shape[0]):
-            x2, y2 = points.iloc[other_cell, :]
-            distance = abs(math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2))
-            distances.append(distance)
-        distances = sorted(distances)
-        shortest_n_distances.extend(distances[cell_tuple[0]: (cell_tuple[1] + 1)])
-    return shortest_n_distances, points.shape[0]
+    points = file_df.loc[:, "X":"Y"].values
+    return list(NearestDistances(points, cell_tuple)), points.shape[0]
+
+
+def NearestDistances(points, cell_tuple):
+    """Distances from every cell in a (cells, 2) array to its cell_tuple[0]-th through cell_tuple[1]-th closest cells,
+    counting the cell itself as the 0th. Returned cell by cell in order of increasing distance, as a flat array."""
+    points = np.asarray(points, dtype=float)
+    k = min(cell_tuple[1] + 1, points.shape[0])
+    if k <= cell_tuple[0]:
+        return np.empty(0)
+    dist, _ = cKDTree(points).query(points, k=k)
+    return np.reshape(dist, (points.shape[0], k))[:, cell_tuple[0]:].ravel()
+
+
+def BatchNearestDistances(point_sets, cell_tuple):
+    """Applies NearestDistances to a list of (cells, 2) arrays, e.g. every file and time point of an experiment."""
+    return [NearestDistances(points, cell_tuple) for points in point_sets]
 
 
 def PlotRipleysK(folder, mutant, treatments, replicates, ax, title=False):
     """Plots the Ripley's K Estimate in comparison to the Poisson for a range of radii"""
-    Kest = RipleysKEstimator(area=158.8761, x_max=14.67, y_max=10.83, x_min=0, y_min=0)
+    import seaborn as sns
+
     r = np.linspace(0, 5, 51)
-    r_for_df = r
-    poisson = Kest.poisson(r)
-    poisson_for_df = poisson
-    # Done 5 times to create total of 6 to match 6 replicates
-    for _ in range(5):
-        poisson_for_df = np.hstack((poisson_for_df, poisson))
-        r_for_df = np.hstack((r_for_df, r))
-    data = np.vstack((r_for_df, poisson_for_df))
-    for treatment in treatments:
-        reps = ripleys_import(replicates, folder, mutant, treatment)
-        treat_array = treat_array_func(reps, Kest, r, poisson)
-        data = np.vstack((data, treat_array))
+    poisson = PoissonK(r)
+    # One Poisson curve per replicate
+    data = np.vstack((np.tile(r, replicates), np.tile(poisson, replicates)))
+    reps = [ripleys_import(replicates, folder, mutant, treatment) for treatment in treatments]
+    Ks = RipleysK([points for rep in reps for points in rep], r)
+    data = np.vstack((data, np.reshape(Ks, (len(treatments), -1))))
     df = pd.DataFrame(data).T
     df.columns = ["Radii", "Poisson", "Untreated", "Erlotinib", "AF154 + Erlotinib"]
     df = pd.melt(df, ["Radii"])
@@ -216,15 +204,14 @@ def PlotRipleysK(folder, mutant, treatments, replicates, ax, title=False):
 
 def BarPlotRipleysK(ax, folder, mutants, xticklabels, treatments, legendlabels, replicates, r, colors, TreatmentFC=False, ylabel=False):
     """Plots a bar graph of the Ripley's K Estimate values for all mutants and conditions in comparison to the Poisson at a discrete radius.
-    Note that radius needs to be input as a 1D array for the RipleysKEstimator to work"""
-    Kest = RipleysKEstimator(area=158.8761, x_max=14.67, y_max=10.83, x_min=0, y_min=0)
-    poisson = Kest.poisson(r)
+    Note that radius needs to be input as a 1D array"""
+    import seaborn as sns
+
+    Ks = RipleysK_import(folder, mutants, treatments, replicates, r)
     mutant_dfs = []
     for z, mutant in enumerate(mutants):
         for j, treatment in enumerate(treatments):
-            reps = ripleys_import(replicates, folder, mutant, treatment)
-            treat_array = treat_array_func(reps, Kest, r, poisson, Kestbool=True)
-            df = pd.DataFrame(treat_array)
+            df = pd.DataFrame(Ks[(mutant, treatment)])
             df.columns = ["K Estimate"]
             df["AXL mutants Y->F"] = xticklabels[z]
             df["Treatment"] = legendlabels[j]
@@ -252,14 +239,17 @@ def BarPlotRipleysK(ax, folder, mutants, xticklabels, treatments, legendlabels,
 
 def BarPlotRipleysK_TimePlots(folder, mutant, extensions, treatments, r, ax):
     """Plots a bar graph of the Ripley's K Estimate values for one mutant in all conditions in comparison to the Poisson at a discrete radius.
-    Note that radius needs to be input as a 1D array for the RipleysKEstimator to work"""
-    Kest = RipleysKEstimator(area=158.8761, x_max=14.67, y_max=10.83, x_min=0, y_min=0)
-    poisson = Kest.poisson(r)
+    Note that radius needs to be input as a 1D array"""
+    import seaborn as sns
+
+    poisson = PoissonK(r)
+    point_sets = []
+    for extension in extensions:
+        file = ImageFile(folder, extension)
+        point_sets.append(file.loc[:, "X":"Y"].values)
+    Ks = RipleysK(point_sets, r) / poisson
     treatment_dfs = []
-    for idx, extension in enumerate(extensions):
-        file = pd.read_csv("msresist/data/Phenotypic_data/Distances/" + folder + "/Results_" + extension + ".csv")
-        points = file.loc[:, "X":"Y"].values
-        treat_array = Kest(data=points, radii=r, mode="ripley") / poisson
+    for idx, treat_array in enumerate(Ks):
         df = pd.DataFrame(treat_array)
         df.columns = ["K Estimate"]
         df["Mutant"] = mutant
@@ -274,14 +264,11 @@ def BarPlotRipleysK_TimePlots(folder, mutant, extensions, treatments, r, ax):
 
 def DataFrameRipleysK(folder, mutants, treatments, replicates, r):
     """Returns a DataFrame of the Ripleys K data along with poisson information"""
-    Kest = RipleysKEstimator(area=158.8761, x_max=14.67, y_max=10.83, x_min=0, y_min=0)
-    poisson = Kest.poisson(r)
+    Ks = RipleysK_import(folder, mutants, treatments, replicates, r)
     mutant_dfs = []
     for mutant in mutants:
         for treatment in treatments:
-            reps = ripleys_import(replicates, folder, mutant, treatment)
-            treat_array = treat_array_func(reps, Kest, r, poisson, Kestbool=True)
-            df = pd.DataFrame(treat_array)
+            df = pd.DataFrame(Ks[(mutant, treatment)])
             df.columns = ["K Estimate"]
             df["Mutant"] = mutant
             df["Treatment"] = treatment
@@ -293,21 +280,17 @@ def DataFrameRipleysK(folder, mutants, treatments, replicates, r):
 
 def PlotRipleysK_TimeCourse(folder, extensions, timepoint, ax):
     """Plots the Ripley's K Estimate for a series of images over time by condition, compared to the Poisson."""
+    import seaborn as sns
+
     r = np.linspace(0, 5, 51)
-    Kest = RipleysKEstimator(area=158.8761, x_max=14.67, y_max=10.83, x_min=0, y_min=0)
-    poisson = Kest.poisson(r)
+    poisson = PoissonK(r)
     data = np.vstack((r, poisson))
     treatments = []
     for extension in extensions:
-        file = pd.read_csv("msresist/data/Phenotypic_data/Distances/" + folder + "/Results_" + extension + "_" + str(timepoint) + ".csv")
+        file = ImageFile(folder, extension, timepoint)
         points = file.loc[:, "X":"Y"].values
         treatments.append(points)
-    Kests = []
-    for point_set in treatments:
-        Kests.append(Kest(data=point_set, radii=r, mode="ripley"))
-    treat_array = np.vstack((Kests[0], Kests[1]))
-    treat_array = np.vstack((treat_array, Kests[2]))
-    data = np.vstack((data, treat_array))
+    data = np.vstack((data, RipleysK(treatments[:3], r)))
     df = pd.DataFrame(data).T
     df.columns = ["Radii", "Poisson", "Untreated", "Erlotinib", "Erlotinib + AF154"]
     df = pd.melt(df, ["Radii"])
@@ -320,31 +303,28 @@ def ripleys_import(replicate_number, folder_name, mutant_name, treatment_name):
     """Imports replicates of the cell locations for analysis by Ripley's K function"""
     reps = []
     for replicate in range(1, replicate_number + 1):
-        if replicate != 1:
-            file = pd.read_csv("msresist/data/Phenotypic_data/Distances/" + folder_name + "/Results_" + mutant_name + treatment_name + str(replicate) + ".csv")
-        else:
-            file = pd.read_csv("msresist/data/Phenotypic_data/Distances/" + folder_name + "/Results_" + mutant_name + treatment_name + ".csv")
+        file = ImageFile(folder_name, mutant_name + treatment_name + (str(replicate) if replicate != 1 else ""))
         points = file.loc[:, "X":"Y"].values
         reps.append(points)
     return reps
 
 
-def treat_array_func(rep_list, Kest_func, radius, poisson_val, Kestbool=False):
+def RipleysK_import(folder_name, mutants, treatments, replicate_number, radius):
+    """Ripley's K estimate relative to the Poisson of every (mutant, treatment, replicate) image, computed in one batch.
+    Returns a dict from (mutant, treatment) to the flattened replicate-by-radius values."""
+    keys = [(mutant, treatment) for mutant in mutants for treatment in treatments]
+    reps = [ripleys_import(replicate_number, folder_name, mutant, treatment) for mutant, treatment in keys]
+    Ks = RipleysK([points for rep in reps for points in rep], radius) / PoissonK(radius)
+    Ks = np.reshape(Ks, (len(keys), -1))
+    return dict(zip(keys, Ks))
+
+
+def treat_array_func(rep_list, radius, poisson_val, Kestbool=False):
     """Applies the Ripley's K function and returns the resulting values as an array"""
-    Kests = []
+    Ks = RipleysK(rep_list, radius)
     if Kestbool:
-        for point_set in rep_list:
-            Kests.append(Kest_func(data=point_set, radii=radius, mode="ripley") / poisson_val)
-        if len(Kests) < 2:
-            treat_array = Kests[0]
-            return treat_array
-    else:
-        for point_set in rep_list:
-            Kests.append(Kest_func(data=point_set, radii=radius, mode="ripley"))
-    treat_array = np.hstack((Kests[0], Kests[1]))
-    for i in range(2, len(Kests)):
-        treat_array = np.hstack((treat_array, Kests[i]))
-    return treat_array
+        Ks = Ks / poisson_val
+    return Ks.ravel()
 
 
 def add_poisson(poisson_val, mutant_name, dataframe):
@@ -2,16 +2,34 @@
 EM Co-Clustering Method using a PAM250 or a Binomial Probability Matrix """
 
 from copy import copy
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
 import scipy.stats as sp
+from scipy.special import logsumexp
 from pomegranate import GeneralMixtureModel, NormalDistribution, IndependentComponentsDistribution
+from .binomial import Binomial
+from .pam250 import PAM250
 
 
-def EM_clustering_repeat(nRepeats=3, *params):
-    output = EM_clustering(*params)
+def EM_clustering_repeat(nRepeats=3, *params, engine="pomegranate", n_jobs=1):
+    """ Run nRepeats + 1 EM fits and keep the one with the highest log-likelihood.
+    With n_jobs > 1 the restarts are spread over a process pool. """
+    EM = EM_clustering_numpy if engine == "numpy" else EM_clustering
 
-    for _ in range(nRepeats):
-        output_temp = EM_clustering(*params)
+    if n_jobs > 1 and nRepeats > 0:
+        return EM_clustering_parallel(EM, nRepeats + 1, params, n_jobs)
+
+    return EM_clustering_best(EM, nRepeats + 1, params)
+
+
+def EM_clustering_best(EM, nRuns, params):
+    """ Run EM nRuns times and return the best output. """
+    output = EM(*params)
+
+    for _ in range(nRuns - 1):
+        output_temp = EM(*params)
 
         # Use the new result if it's better
         if output_temp[0] > output[0]:
@@ -20,7 +38,81 @@ def EM_clustering_repeat(nRepeats=3, *params):
     return output
 
 
-def EM_clustering(data, info, ncl, seqDist=None, gmmIn=None, verbose=False):
+SharedArray = namedtuple("SharedArray", ["name", "shape", "dtype"])
+worker_blocks = []  # shared memory attached by a worker, kept open for the life of the process
+
+
+def EM_clustering_parallel(EM, nRuns, params, n_jobs):
+    """ Split the EM restarts across worker processes. The sequence backgrounds are placed in shared
+    memory once, and each worker only sends back the best of its own restarts. """
+    data, info, ncl, seqDist = params[:4]
+    blocks = []
+    try:
+        packed = pack_dist(seqDist, blocks)
+        chunks = [len(c) for c in np.array_split(np.arange(nRuns), min(n_jobs, nRuns))]
+        seeds = np.random.randint(2 ** 31 - 1, size=len(chunks))
+
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = [executor.submit(EM_worker, EM, nn, seed, (data, info, ncl, packed) + tuple(params[4:])) for nn, seed in zip(chunks, seeds)]
+            outputs = [f.result() for f in futures]
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    return max(outputs, key=lambda out: out[0])
+
+
+def EM_worker(EM, nRuns, seed, params):
+    """ Attach to the shared backgrounds, rebuild the sequence distributions and run the restarts. """
+    np.random.seed(seed)
+    seqDist = unpack_dist(params[3], worker_blocks)
+    return EM_clustering_best(EM, nRuns, params[:3] + (seqDist,) + tuple(params[4:]))
+
+
+def pack_dist(dist, blocks):
+    """ Replace the sequence background arrays of a distribution by shared memory handles. """
+    if isinstance(dist, list):
+        return [pack_dist(dd, blocks) for dd in dist]
+    if isinstance(dist, Binomial):
+        return (Binomial, (dist.seq, dist.seqs, dist.SeqWeight), share_array(dist.background, blocks))
+    if isinstance(dist, PAM250):
+        return (PAM250, (dist.seqs, dist.SeqWeight), share_array(dist.background, blocks))
+    return dist
+
+
+def unpack_dist(packed, blocks):
+    """ Rebuild a distribution packed by pack_dist on top of the shared background. """
+    if isinstance(packed, list):
+        return [unpack_dist(pp, blocks) for pp in packed]
+    if isinstance(packed, tuple):
+        clss, args, background = packed
+        return clss(*args, attach_array(background, blocks))
+    return packed
+
+
+def share_array(arr, blocks):
+    """ Copy an array (or tuple of arrays) into shared memory. """
+    if isinstance(arr, tuple):
+        return tuple(share_array(a, blocks) for a in arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+    blocks.append(shm)
+    return SharedArray(shm.name, arr.shape, arr.dtype.str)
+
+
+def attach_array(desc, blocks):
+    """ Read-only view of an array placed in shared memory by share_array. """
+    if not isinstance(desc, SharedArray):
+        return tuple(attach_array(d, blocks) for d in desc)
+    shm = shared_memory.SharedMemory(name=desc.name)
+    blocks.append(shm)
+    arr = np.ndarray(desc.shape, dtype=desc.dtype, buffer=shm.buf)
+    arr.flags.writeable = False
+    return arr
+
+
+def EM_clustering(data, info, ncl, seqDist=None, gmmIn=None, verbose=False, max_iterations=500):
     """ Compute EM algorithm to cluster MS data using both data info and seq info.  """
     d = np.array(data.T)
 
@@ -46,7 +138,7 @@ def EM_clustering(data, info, ncl, seqDist=None, gmmIn=None, verbose=False):
         else:
             gmm = gmmIn
 
-        gmm.fit(d, max_iterations=500, verbose=verbose, stop_threshold=1e-4)
+        gmm.fit(d, max_iterations=max_iterations, verbose=verbose, stop_threshold=1e-4)
         scores = gmm.predict_proba(d)
 
         if np.all(np.isfinite(scores)):
@@ -59,3 +151,103 @@ def EM_clustering(data, info, ncl, seqDist=None, gmmIn=None, verbose=False):
     assert np.all(np.isfinite(seq_scores))
 
     return avgScore, scores, seq_scores, gmm
+
+
+class DiagonalMixture:
+    """ Fitted parameters of the numpy EM engine. Means and variances are (K, D) arrays,
+    weights are the K mixture proportions and logWeights hold the (K, N) sequence log-likelihoods. """
+
+    def __init__(self, means, variances, weights, logWeights):
+        self.means = means
+        self.variances = variances
+        self.weights = weights
+        self.logWeights = logWeights
+
+
+def mixture_from_gmm(gmm):
+    """ Convert a fitted pomegranate GeneralMixtureModel into a DiagonalMixture. """
+    means = np.array([[dist.parameters[0] for dist in distClust[:-1]] for distClust in gmm.distributions])
+    stds = np.array([[dist.parameters[1] for dist in distClust[:-1]] for distClust in gmm.distributions])
+    logWeights = np.array([distClust[-1].logWeights for distClust in gmm.distributions])
+    return DiagonalMixture(means, np.square(stds), np.exp(gmm.weights), logWeights)
+
+
+def gaussian_loglik(d, means, variances):
+    """ Diagonal Gaussian log-likelihood of every peptide under every cluster, (N, K).
+    Missing values contribute zero, as in pomegranate. """
+    mask = np.isfinite(d)
+    d0 = np.where(mask, d, 0.0)
+    mask = mask.astype(float)
+    prec = 1.0 / variances
+
+    quad = np.square(d0) @ prec.T - 2.0 * d0 @ (means * prec).T + mask @ (np.square(means) * prec).T
+    return -0.5 * (mask @ np.log(2.0 * np.pi * variances).T + quad)
+
+
+def seq_loglik(seqDist, scores, seqs=None):
+    """ (N, K) sequence log-likelihood after updating every cluster from the responsibilities. A single
+    distribution is shared by all clusters; a list holds one distribution per cluster. If seqs is given,
+    the log-likelihood of those peptides is returned instead of the training ones. """
+    if isinstance(seqDist, list):
+        return np.hstack([seq_loglik(dist, scores[:, [jj]], seqs) for jj, dist in enumerate(seqDist)])
+    if seqs is None:
+        return seqDist.batch_logWeights(scores)
+    return seqDist.batch_logWeights(scores, seqDist.encode(seqs))
+
+
+def EM_clustering_numpy(data, info, ncl, seqDist=None, gmmIn=None, verbose=False, max_iterations=500, stop_threshold=1e-4, min_std=0.01):
+    """ Same EM as EM_clustering but with batched numpy updates instead of pomegranate distributions. """
+    d = np.array(data.T, dtype=float)
+    mask = np.isfinite(d)
+    d0 = np.where(mask, d, 0.0)
+    maskf = mask.astype(float)
+
+    for _ in range(10):
+        if gmmIn is None:
+            means = sp.norm.rvs(size=(ncl, d.shape[1]))
+            variances = np.full((ncl, d.shape[1]), 0.2 ** 2)
+            weights = np.full(ncl, 1.0 / ncl)
+            seqLL = seq_loglik(seqDist, np.zeros((d.shape[0], ncl)))
+        else:
+            if not isinstance(gmmIn, DiagonalMixture):
+                gmmIn = mixture_from_gmm(gmmIn)
+            means, variances, weights = gmmIn.means.copy(), gmmIn.variances.copy(), gmmIn.weights.copy()
+            seqLL = gmmIn.logWeights.T.copy()
+
+        lastLL = -np.inf
+        for ii in range(int(max_iterations) + 1):
+            if ii > 0:
+                # M step: weighted moments over the observed values only
+                wsum = scores.T @ maskf
+                keep = wsum < 1e-8
+                newMeans = scores.T @ d0 / np.where(keep, 1.0, wsum)
+                newVar = scores.T @ np.square(d0) / np.where(keep, 1.0, wsum) - np.square(newMeans)
+                means = np.where(keep, means, newMeans)
+                variances = np.where(keep, variances, np.maximum(newVar, min_std ** 2))
+                weights = scores.sum(axis=0) / scores.shape[0]
+
+                seqLL = seq_loglik(seqDist, scores)
+
+            # E step
+            with np.errstate(divide="ignore"):
+                logp = gaussian_loglik(d, means, variances) + seqLL + np.log(weights)
+            norm = logsumexp(logp, axis=1)
+            scores = np.exp(logp - norm[:, np.newaxis])
+            avgScore = np.sum(norm)
+
+            if verbose:
+                print("[{}] Improvement: {}".format(ii, avgScore - lastLL))
+            if ii > 0 and avgScore - lastLL <= stop_threshold:
+                break
+            lastLL = avgScore
+
+        if np.all(np.isfinite(scores)):
+            break
+
+    gmm = DiagonalMixture(means, variances, weights, seqLL.T.copy())
+    seq_scores = np.exp(gmm.logWeights)
+
+    assert np.all(np.isfinite(scores))
+    assert np.all(np.isfinite(seq_scores))
+
+    return avgScore, scores, seq_scores, gmm
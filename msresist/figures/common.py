@@ -1,14 +1,16 @@
 """
 This file contains functions that are used in multiple figures.
 """
+import pickle
+from functools import lru_cache
 from string import ascii_uppercase
 from matplotlib import gridspec, pyplot as plt
-import seaborn as sns
-import svgutils.transform as st
 
 
 def getSetup(figsize, gridd, multz=None, empts=None):
     """ Establish figure set-up with subplots. """
+    import seaborn as sns
+
     sns.set(style="whitegrid", font_scale=0.7, color_codes=True, palette="colorblind", rc={"grid.linestyle": "dotted", "axes.linewidth": 0.6})
 
     # create empty list if empts isn't specified
@@ -36,6 +38,13 @@ def getSetup(figsize, gridd, multz=None, empts=None):
     return (ax, f)
 
 
+@lru_cache(maxsize=None)
+def loadModel(fname):
+    """ Unpickle a fitted model once per process, so figures rendered together share it. The model must not be modified. """
+    with open(fname, "rb") as m:
+        return pickle.load(m)
+
+
 def subplotLabel(axs):
     """ Place subplot labels on the list of axes. """
     for ii, ax in enumerate(axs):
@@ -44,6 +53,7 @@ def subplotLabel(axs):
 
 def overlayCartoon(figFile, cartoonFile, x, y, scalee=1, scale_x=1, scale_y=1, rotate=None):
     """ Add cartoon to a figure file. """
+    import svgutils.transform as st
 
     # Overlay Figure cartoons
     template = st.fromfile(figFile)
@@ -8,12 +8,11 @@ import numpy as np
 import seaborn as sns
 import matplotlib.cm as cm
 import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
 from .common import subplotLabel, getSetup
 from ..motifs import MapMotifs
 from ..pre_processing import preprocessing, y_pre, MapOverlappingPeptides, BuildMatrix, TripsMeanAndStd, FixColumnLabels, CorrCoefFilter
 from ..distances import BarPlotRipleysK, DataFrameRipleysK, PlotRipleysK
+from ..phenotypes import IncucyteExport
 
 sns.set(color_codes=True)
 
@@ -48,7 +47,7 @@ def makeFigure():
     ax[0].axis("off")
 
     # AXL expression data
-    axl = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/AXLexpression.csv")
+    axl = IncucyteExport("AXLmutants/AXLexpression.csv")
     axl = pd.melt(axl, value_vars=["AXL", "GFP"], id_vars="AXL mutants Y—>F", value_name="% Cells", var_name="Signal")
     sns.barplot(data=axl, x="AXL mutants Y—>F", y="% Cells", hue="Signal", ax=ax[1], palette=sns.xkcd_palette(["white", "darkgreen"]), **{"linewidth": 0.5}, **{"edgecolor": "black"})
     ax[1].set_title("Ectopic AXL expression")
@@ -92,25 +91,25 @@ def makeFigure():
 def import_phenotype_data(phenotype="Cell Viability"):
     """Import all bioreplicates of a specific phenotype"""
     if phenotype == "Cell Viability":
-        cv1 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/CellViability/Phase/BR1_Phase.csv")
-        cv2 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/CellViability/Phase/BR2_Phase.csv")
-        cv3 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/CellViability/Phase/BR3_Phase.csv")
-        cv4 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/CellViability/Phase/BR4_Phase.csv")
+        cv1 = IncucyteExport("AXLmutants/CellViability/Phase/BR1_Phase.csv")
+        cv2 = IncucyteExport("AXLmutants/CellViability/Phase/BR2_Phase.csv")
+        cv3 = IncucyteExport("AXLmutants/CellViability/Phase/BR3_Phase.csv")
+        cv4 = IncucyteExport("AXLmutants/CellViability/Phase/BR4_Phase.csv")
         res = FixColumnLabels([cv1, cv2, cv3, cv4])
 
     elif phenotype == "Cell Death":
-        red1 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/CellViability/Red/BR1_RedCount.csv")
-        red2 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/CellViability/Red/BR2_RedCount.csv")
-        red3 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/CellViability/Red/BR3_RedCount.csv")
-        red4 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/CellViability/Red/BR4_RedCount.csv")
+        red1 = IncucyteExport("AXLmutants/CellViability/Red/BR1_RedCount.csv")
+        red2 = IncucyteExport("AXLmutants/CellViability/Red/BR2_RedCount.csv")
+        red3 = IncucyteExport("AXLmutants/CellViability/Red/BR3_RedCount.csv")
+        red4 = IncucyteExport("AXLmutants/CellViability/Red/BR4_RedCount.csv")
         red4.columns = red3.columns
         res = FixColumnLabels([red1, red2, red3, red4])
         res = normalize_cellsDead_to_cellsAlive(res)
 
     elif phenotype == "Migration":
-        sw2 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/EMT/BR2_RWD.csv")
-        sw3 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/EMT/BR3_RWD.csv")
-        sw4 = pd.read_csv("msresist/data/Phenotypic_data/AXLmutants/EMT/BR4_RWD.csv")
+        sw2 = IncucyteExport("AXLmutants/EMT/BR2_RWD.csv")
+        sw3 = IncucyteExport("AXLmutants/EMT/BR3_RWD.csv")
+        sw4 = IncucyteExport("AXLmutants/EMT/BR4_RWD.csv")
         res = fix_migration_columns(sw2, sw3, sw4)
 
     elif phenotype == "Island":
@@ -133,6 +132,8 @@ def normalize_cellsDead_to_cellsAlive(red):
 
 def formatPhenotypesForModeling(cv, red, sw, c):
     """Format and merge phenotye data sets for modeling"""
+    from sklearn.preprocessing import StandardScaler
+
     # Cell Viability
     v_ut = y_pre(cv, "UT", 96, "Viability", all_lines, itp=itp)
     v_e = y_pre(cv, "-E", 96, "Viability", all_lines, itp=itp)
@@ -356,6 +357,8 @@ def pca_dfs(scores, loadings, df, n_components, sIDX, lIDX):
 
 def plotPCA(ax, d, n_components, scores_ind, loadings_ind, hue_scores=None, style_scores=None, pvals=None, style_load=None, legendOut=False):
     """ Plot PCA scores and loadings. """
+    from sklearn.decomposition import PCA
+
     pp = PCA(n_components=n_components)
     dScor_ = pp.fit_transform(d.select_dtypes(include=["float64"]).values)
     dLoad_ = pp.components_
@@ -388,6 +391,8 @@ def plotPCA(ax, d, n_components, scores_ind, loadings_ind, hue_scores=None, styl
 
 def plotPCA_scoresORloadings(ax, d, n_components, scores_ind, loadings_ind, hue_scores=None, style_scores=None, pvals=None, style_load=None, legendOut=False, plot="scores", annotateScores=False):
     """Plot PCA scores only"""
+    from sklearn.decomposition import PCA
+
     pp = PCA(n_components=n_components)
     dScor_ = pp.fit_transform(d.select_dtypes(include=["float64"]).values)
     dLoad_ = pp.components_
@@ -423,6 +428,8 @@ def plotPCA_scoresORloadings(ax, d, n_components, scores_ind, loadings_ind, hue_
 
 def plotpca_explained(ax, data, ncomp):
     """ Cumulative variance explained for each principal component. """
+    from sklearn.decomposition import PCA
+
     explained = PCA(n_components=ncomp).fit(data).explained_variance_ratio_
     acc_expl = []
 
@@ -441,6 +448,7 @@ def plotpca_explained(ax, data, ncomp):
 
 
 def plotpca_ScoresLoadings(ax, data, pn, ps):
+    from sklearn.decomposition import PCA
     fit = PCA(n_components=2).fit(data)
     PC1_scores, PC2_scores = fit.transform(data)[:, 0], fit.transform(data)[:, 1]
     PC1_loadings, PC2_loadings = fit.components_[0], fit.components_[1]
@@ -509,6 +517,8 @@ def plotpca_ScoresLoadings(ax, data, pn, ps):
 def plotpca_ScoresLoadings_plotly(data, title, loc=False):
     """ Interactive PCA plot. Note that this works best by pre-defining the dataframe's
     indices which will serve as labels for each dot in the plot. """
+    from sklearn.decomposition import PCA
+
     fit = PCA(n_components=2).fit(data)
 
     scores = pd.concat([pd.DataFrame(fit.transform(data)[:, 0]), pd.DataFrame(fit.transform(data)[:, 1])], axis=1)
@@ -2,21 +2,13 @@
 This creates Figure 2: Model figure
 """
 
-import pickle
 import pandas as pd
 import numpy as np
-import seaborn as sns
 import scipy as sp
 import matplotlib.colors as colors
 import matplotlib.cm as cm
-import logomaker as lm
-from sklearn.cross_decomposition import PLSRegression
-from sklearn.decomposition import PCA
-from sklearn.neighbors import NearestNeighbors
-from sklearn.model_selection import cross_val_predict
-from sklearn.cluster import KMeans
 from pomegranate import GeneralMixtureModel, NormalDistribution
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 from ..pre_processing import preprocessing, MeanCenter
 from ..clustering import MassSpecClustering, PSPLdict, KinToPhosphotypeDict
 from ..binomial import AAlist
@@ -26,6 +18,9 @@ from .figure1 import import_phenotype_data, formatPhenotypesForModeling, plotPCA
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+    from sklearn.cross_decomposition import PLSRegression
+
     # Get list of axis objects
     ax, f = getSetup((14, 6), (2, 4), multz={0: 1, 2: 1})
 
@@ -36,8 +31,7 @@ def makeFigure():
     sns.set(style="whitegrid", font_scale=1.2, color_codes=True, palette="colorblind", rc={"grid.linestyle": "dotted", "axes.linewidth": 0.6})
 
     # Load DDMC
-    with open("msresist/data/pickled_models/AXLmodel_PAM250_W2-5_5CL", "rb") as m:
-        model = pickle.load(m)
+    model = loadModel("msresist/data/pickled_models/AXLmodel_PAM250_W2-5_5CL")
     centers = model.transform()
 
     # Import phenotypes
@@ -76,6 +70,8 @@ def makeFigure():
 
 def plotGridSearch(ax, gs):
     """ Plot gridsearch results by ranking. """
+    import seaborn as sns
+
     ax = sns.barplot(x="rank_test_score", y="mean_test_score", data=np.abs(gs.iloc[:20, :]), ax=ax, **{"linewidth": 0.5}, **{"edgecolor": "black"})
     ax.set_title("Hyperaparameter Search")
     ax.set_xticklabels(np.arange(1, 21))
@@ -101,6 +97,8 @@ def plotR2YQ2Y(ax, model, X, Y, b=3, color="darkblue", title=False):
 
 def ComputeCenters(X, d, i, ddmc, ncl):
     """Calculate cluster centers of  different algorithms."""
+    from sklearn.cluster import KMeans
+
     # k-means
     labels = KMeans(n_clusters=ncl).fit(d.T).labels_
     x_ = X.copy()
@@ -124,6 +122,10 @@ def ComputeCenters(X, d, i, ddmc, ncl):
 
 def plotStripActualVsPred(ax, n_components, Xs, Y, models):
     """Actual vs Predicted of different PLSR models"""
+    import seaborn as sns
+    from sklearn.cross_decomposition import PLSRegression
+    from sklearn.model_selection import cross_val_predict
+
     datas = []
     for ii, X in enumerate(Xs):
         data = pd.DataFrame()
@@ -141,6 +143,9 @@ def plotStripActualVsPred(ax, n_components, Xs, Y, models):
 
 def plotActualVsPredicted(ax, plsr_model, X, Y, y_pred="cross-validation", color="darkblue", type="scatter", title=False):
     """ Plot exprimentally-measured vs PLSR-predicted values. """
+    import seaborn as sns
+    from sklearn.model_selection import cross_val_predict
+
     if y_pred == "cross-validation":
         Y_predictions = cross_val_predict(plsr_model, X, Y, cv=Y.shape[0])
         ylabel = "Predicted"
@@ -233,6 +238,7 @@ def plotScoresLoadings(ax, model, X, Y, ncl, treatments, pcX=1, pcY=2, data="clu
 
 
 def plotCenters(ax, model, xlabels, yaxis=False, drop=False):
+    import seaborn as sns
     centers = pd.DataFrame(model.transform()).T
     centers.columns = xlabels
     if drop:
@@ -255,6 +261,8 @@ def plotCenters(ax, model, xlabels, yaxis=False, drop=False):
 
 def plotMotifs(pssms, axes, titles=False, yaxis=False):
     """Generate logo plots of a list of PSSMs"""
+    import logomaker as lm
+
     for i, ax in enumerate(axes):
         pssm = pssms[i].T
         if pssm.shape[0] == 11:
@@ -280,6 +288,8 @@ def plotMotifs(pssms, axes, titles=False, yaxis=False):
 
 def plot_LassoCoef(ax, model, title=False):
     """Plot Lasso Coefficients"""
+    import seaborn as sns
+
     coefs = pd.DataFrame(model.coef_).T
     coefs.index += 1
     coefs = coefs.reset_index()
@@ -301,6 +311,8 @@ def store_cluster_members(X, model, filename, cols):
 
 def plotDistanceToUpstreamKinase(model, clusters, ax, kind="strip", num_hits=5, additional_pssms=False, add_labels=False, title=False):
     """Plot Frobenius norm between kinase PSPL and cluster PSSMs"""
+    import seaborn as sns
+
     ukin = model.predict_UpstreamKinases(additional_pssms=additional_pssms)
     ukin_mc = MeanCenter(ukin, mc_col=True, mc_row=True)
     if isinstance(add_labels, list):
@@ -350,7 +362,7 @@ def AnnotateUpstreamKinases(model, clusters, ax, data, num_hits=1):
         hits = cluster.sort_values(by="Frobenius Distance", ascending=True)
         hits.index = np.arange(hits.shape[0])
         hits["Phosphoacceptor"] = [KinToPhosphotypeDict[kin] for kin in hits["Kinase"]]
-        cCP = pssms[c - 1].iloc[:, 5].idxmax()
+        cCP = AAlist[np.argmax(pssms[c - 1, :, 5])]
         if cCP == "S" or cCP == "T":
             cCP = "S/T"
         hits = hits[hits["Phosphoacceptor"] == cCP]
@@ -406,6 +418,8 @@ def ShufflePositions(pssm):
 def label_point(X, model, clusters, pspl, ax, n_neighbors=5):
     """Add labels to data points. Note not in use at the moment but could be helpful
     in the future (e.g. PCA of mass spec in figure 2)"""
+    from sklearn.neighbors import NearestNeighbors
+
     if isinstance(clusters, int):
         clusters = [clusters]
     pspl_ = pspl.copy()
@@ -5,7 +5,6 @@ This creates Figure 3: ABL/SFK/YAP experimental validations
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
 from .common import subplotLabel, getSetup
 from .figure1 import TimePointFoldChange, plot_IdSites
 from msresist.pre_processing import preprocessing
@@ -13,6 +12,8 @@ from msresist.pre_processing import preprocessing
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+
     # Get list of axis objects
     ax, f = getSetup((16, 11), (4, 4), multz={4: 1, 6: 1, 8: 2, 13: 1})
 
@@ -52,6 +53,7 @@ def makeFigure():
 
 
 def plot_YAPinhibitorTimeLapse(ax, X, ylim=False):
+    import seaborn as sns
     lines = ["WT", "KO"]
     treatments = ["UT", "E", "E/R", "E/A"]
     for i, line in enumerate(lines):
@@ -107,6 +109,8 @@ def plotHyerGeomTestDasDRGenes(ax):
     - s = das responding among N
     - k = overlap
     Counts generated using GenerateHyperGeomTestParameters()."""
+    import seaborn as sns
+
     hg = pd.DataFrame()
     hg["Cluster"] = np.arange(5) + 1
     hg["p_value"] = [0.515, 0.179, 0.244, 0.0013, 0.139]
@@ -129,6 +133,8 @@ def GenerateHyperGeomTestParameters(A, X, dasG, cluster):
 
 def plot_DasDR_timepoint(ax, inhibitor, time=96):
     """Plot dasatinib DR at specified time point."""
+    import seaborn as sns
+
     if inhibitor == "dasatinib":
         inh = [pd.read_csv("msresist/data/Validations/Experimental/DoseResponses/Dasatinib.csv"),
                pd.read_csv("msresist/data/Validations/Experimental/DoseResponses/Dasatinib_2fixed.csv")]
@@ -144,6 +150,8 @@ def plot_DasDR_timepoint(ax, inhibitor, time=96):
 
 def plot_pAblSrcYap(ax):
     """Plot luminex p-signal of p-ABL, p-SRC, and p-YAP 127."""
+    import seaborn as sns
+
     mfi_AS = pd.read_csv("msresist/data/Validations/Luminex/DasatinibDR_newMEK_lysisbuffer.csv")
     mfi_AS = pd.melt(mfi_AS, id_vars=["Treatment", "Line", "Lysis_Buffer"], value_vars=["p-MEK", "p-YAP", "p-ABL", "p-SRC"], var_name="Protein", value_name="p-Signal")
     mfi_YAP = pd.read_csv("msresist/data/Validations/Luminex/DasatinibDR_pYAP127_check.csv")
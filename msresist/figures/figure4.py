@@ -5,11 +5,11 @@ This creates Figure 4.
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
 from .figure1 import TimePointFoldChange
 
 
 def plot_YAPinhibitorTimeLapse(ax, X):
+    import seaborn as sns
     lines = ["WT", "KO"]
     treatments = ["UT", "E", "E/R", "E/A"]
     for i, line in enumerate(lines):
@@ -5,10 +5,8 @@ This creates KRAS figure
 import pandas as pd
 import numpy as np
 import seaborn as sns
-import pickle
 from scipy.stats import zscore
-from sklearn.cross_decomposition import PLSRegression
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 from ..pre_processing import MeanCenter
 from ..validations import pos_to_motif
 from ..clustering import MassSpecClustering
@@ -43,8 +41,7 @@ def makeFigure():
     i = X.select_dtypes(include=[object])
 
     # Unpickle DDMC model and find clusters
-    with open('msresist/data/pickled_models/KRAS_Haura_Binomial_CL15_W10', 'rb') as m:
-        model = pickle.load(m)
+    model = loadModel('msresist/data/pickled_models/KRAS_Haura_Binomial_CL15_W10')
 
     centers = pd.DataFrame(model.transform()).T
     centers.columns = d.index
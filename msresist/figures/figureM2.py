@@ -3,23 +3,20 @@ This creates Figure 3: Evaluation of Imputating Missingness
 """
 import glob
 import pickle
-import random
 import numpy as np
 from scipy.stats import gmean
 import pandas as pd
-import seaborn as sns
-from sklearn.metrics import mean_squared_error
-from statsmodels.multivariate.pca import PCA
 from .common import subplotLabel, getSetup
-from ..clustering import MassSpecClustering
-from ..pre_processing import filter_NaNpeptides, FindIdxValues
 from ..binomial import Binomial
 from ..pam250 import PAM250
 from ..expectation_maximization import EM_clustering
+from ..imputation import ImputationBenchmark
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+
     # Get list of axis objects
     ax, f = getSetup((12, 10), (3, 4), multz={0: 3})
 
@@ -45,6 +42,8 @@ def makeFigure():
 
 def plotMissingnessDensity(ax, d):
     """Plot amount of missingness per peptide."""
+    import seaborn as sns
+
     p_nan_counts = []
     for i in range(d.shape[1]):
         p_nan_counts.append(np.count_nonzero(np.isnan(d[i])))
@@ -62,6 +61,8 @@ def plotMissingnessDensity(ax, d):
 
 def plotErrorAcrossNumberOfClustersOrWeights(ax, kind, legend=True):
     """Plot artificial missingness error across different number of clusters or weighths."""
+    import seaborn as sns
+
     if kind == "Weight":
         data = pd.read_csv("msresist/data/imputing_missingness/binom_GSWeights_5runs_AvgMinZeroPCA.csv")
         title = "Weight Selection"
@@ -91,6 +92,8 @@ def plotErrorAcrossNumberOfClustersOrWeights(ax, kind, legend=True):
 
 def plotErrorAcrossClustersOrWeightsAndMissingness(ax, kind):
     """Plot artificial missingness error across different number of clusters."""
+    import seaborn as sns
+
     if kind == "Weight":
         data = pd.read_csv("msresist/data/imputing_missingness/binom_GSWeights_5runs_AvgMinZeroPCA.csv")
         enu = [0, 5, 40]
@@ -120,6 +123,8 @@ def plotErrorAcrossClustersOrWeightsAndMissingness(ax, kind):
 
 def plotErrorAcrossMissingnessLevels(ax):
     """Plot artificial missingness error across verying missignenss."""
+    import seaborn as sns
+
     data = pd.read_csv("/home/marcc/resistance-MS/msresist/data/imputing_missingness/binom_AM_5runs_AvgMinZeroPCA.csv")
     gm = pd.DataFrame(data.groupby(["Weight", "Missingness"]).DDMC.apply(gmean)).reset_index()
     gm["DDMC"] = np.log(gm["DDMC"])
@@ -167,161 +172,26 @@ def plotErrorAcrossMissingnessLevels(ax):
 
 # ---------------------------------------- Functions to calculate imputation errors ---------------------------------------- #
 
-def ErrorAcrossMissingnessLevels(distance_method, weights, n_runs=5, ncl=15, tmt=7):
+def ErrorAcrossMissingnessLevels(distance_method, weights, n_runs=5, ncl=15, tmt=7, n_jobs=None):
     """Incorporate different percentages of missing values in 'chunks' 8 observations and compute error
     between the actual versus cluster center or imputed peptide average across patients. Only peptides >= 7 TMT experiments."""
-    X = filter_NaNpeptides(pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:], tmt=tmt)
-    X.index = np.arange(X.shape[0])
-    md = X.copy()
-    X = X.select_dtypes(include=['float64']).values
-    errors = np.zeros((X.shape[0] * len(weights) * n_runs, 9))
-    for ii in range(n_runs):
-        vals = FindIdxValues(md)
-        md, nan_indices = IncorporateMissingValues(md, vals)
-        data = md.select_dtypes(include=['float64']).T
-        info = md.select_dtypes(include=['object'])
-        missingness = (np.count_nonzero(np.isnan(data), axis=0) / data.shape[0] * 100).astype(float)
-        baseline_errors = ComputeBaselineErrors(X, data.T, nan_indices)
-        for jj, w in enumerate(weights):
-            model = MassSpecClustering(info, ncl, w, distance_method).fit(data, nRepeats=0)
-            idx1 = X.shape[0] * ((ii * len(weights)) + jj)
-            idx2 = X.shape[0] * ((ii * len(weights)) + jj + 1)
-            errors[idx1:idx2, 0] = ii
-            errors[idx1:idx2, 1] = md.index
-            errors[idx1:idx2, 2] = missingness
-            errors[idx1:idx2, 3] = model.SeqWeight
-            errors[idx1:idx2, 4] = ComputeModelError(X, data.T, nan_indices, model)
-            errors[idx1:idx2, 5] = baseline_errors[0, :]  # Average
-            errors[idx1:idx2, 6] = baseline_errors[1, :]  # Zero
-            errors[idx1:idx2, 7] = baseline_errors[2, :]  # Minimum
-            errors[idx1:idx2, 8] = baseline_errors[3, :]  # PCA
-
-    df = pd.DataFrame(errors)
-    df.columns = ["N_Run", "Peptide_Idx", "Missingness", "Weight", "DDMC", "Average", "Zero", "Minimum", "PCA"]
-
-    return df
-
-
-def ErrorAcrossNumberOfClusters(distance_method, weight, n_runs=5, tmt=7, n_clusters=[6, 9, 12, 15, 18, 21]):
-    """Calculate missingness error across different number of clusters."""
-    X = filter_NaNpeptides(pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:], tmt=tmt)
-    X.index = np.arange(X.shape[0])
-    md = X.copy()
-    X = X.select_dtypes(include=['float64']).values
-    errors = np.zeros((X.shape[0] * len(n_clusters) * n_runs, 9))
-    for ii in range(n_runs):
-        print("Run: ", ii)
-        vals = FindIdxValues(md)
-        md, nan_indices = IncorporateMissingValues(md, vals)
-        data = md.select_dtypes(include=['float64']).T
-        info = md.select_dtypes(include=['object'])
-        missingness = (np.count_nonzero(np.isnan(data), axis=0) / data.shape[0] * 100).astype(float)
-        baseline_errors = ComputeBaselineErrors(X, data.T, nan_indices)
-        for jj, cluster in enumerate(n_clusters):
-            print("#clusters: ", cluster)
-            model = MassSpecClustering(info, cluster, weight, distance_method).fit(data, nRepeats=0)
-            idx1 = X.shape[0] * ((ii * len(n_clusters)) + jj)
-            idx2 = X.shape[0] * ((ii * len(n_clusters)) + jj + 1)
-            errors[idx1:idx2, 0] = ii
-            errors[idx1:idx2, 1] = md.index
-            errors[idx1:idx2, 2] = missingness
-            errors[idx1:idx2, 3] = cluster
-            errors[idx1:idx2, 4] = ComputeModelError(X, data.T, nan_indices, model)
-            errors[idx1:idx2, 5] = baseline_errors[0, :]  # Average
-            errors[idx1:idx2, 6] = baseline_errors[1, :]  # Zero
-            errors[idx1:idx2, 7] = baseline_errors[2, :]  # Minimum
-            errors[idx1:idx2, 8] = baseline_errors[3, :]  # PCA
-
-    df = pd.DataFrame(errors)
-    df.columns = ["N_Run", "Peptide_Idx", "Missingness", "Clusters", "DDMC", "Average", "Zero", "Minimum", "PCA"]
-
-    return df
-
-
-def ErrorAcrossWeights(distance_method, weights, ncl=20, n_runs=5, tmt=7):
+    grid = {"ncl": [ncl], "SeqWeight": weights, "distance_method": [distance_method]}
+    df = ImputationBenchmark(grid, n_runs=n_runs, tmt=tmt, n_jobs=n_jobs)
+    return df[["N_Run", "Peptide_Idx", "Missingness", "Weight", "DDMC", "Average", "Zero", "Minimum", "PCA"]]
+
+
+def ErrorAcrossNumberOfClusters(distance_method, weight, n_runs=5, tmt=7, n_clusters=[6, 9, 12, 15, 18, 21], n_jobs=None):
     """Calculate missingness error across different number of clusters."""
-    X = filter_NaNpeptides(pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:], tmt=tmt)
-    X.index = np.arange(X.shape[0])
-    md = X.copy()
-    X = X.select_dtypes(include=['float64']).values
-    errors = np.zeros((X.shape[0] * len(weights) * n_runs, 9))
-    for ii in range(n_runs):
-        print("Run :", ii)
-        vals = FindIdxValues(md)
-        md, nan_indices = IncorporateMissingValues(md, vals)
-        data = md.select_dtypes(include=['float64']).T
-        info = md.select_dtypes(include=['object'])
-        missingness = (np.count_nonzero(np.isnan(data), axis=0) / data.shape[0] * 100).astype(float)
-        baseline_errors = ComputeBaselineErrors(X, data.T, nan_indices)
-        for jj, w in enumerate(weights):
-            print("Weight: ", w)
-            model = MassSpecClustering(info, ncl, w, distance_method).fit(data, nRepeats=0)
-            idx1 = X.shape[0] * ((ii * len(weights)) + jj)
-            idx2 = X.shape[0] * ((ii * len(weights)) + jj + 1)
-            errors[idx1:idx2, 0] = ii
-            errors[idx1:idx2, 1] = md.index
-            errors[idx1:idx2, 2] = missingness
-            errors[idx1:idx2, 3] = model.SeqWeight
-            errors[idx1:idx2, 4] = ComputeModelError(X, data.T, nan_indices, model)
-            errors[idx1:idx2, 5] = baseline_errors[0, :]  # Average
-            errors[idx1:idx2, 6] = baseline_errors[1, :]  # Zero
-            errors[idx1:idx2, 7] = baseline_errors[2, :]  # Minimum
-            errors[idx1:idx2, 8] = baseline_errors[3, :]  # PCA
-
-    df = pd.DataFrame(errors)
-    df.columns = ["N_Run", "Peptide_Idx", "Missingness", "Weight", "DDMC", "Average", "Zero", "Minimum", "PCA"]
-
-    return df
-
-
-def IncorporateMissingValues(X, vals):
-    """Remove a random TMT experiment for each peptide. If a peptide already has the maximum amount of
-    missingness allowed, don't remove."""
-    d = X.select_dtypes(include=["float64"])
-    tmt_idx = []
-    for ii in range(d.shape[0]):
-        tmt = random.sample(list(set(vals[vals[:, 0] == ii][:, -1])), 1)[0]
-        a = vals[(vals[:, -1] == tmt) & (vals[:, 0] == ii)]
-        tmt_idx.append((a[0, 0], a[:, 1]))
-        X.iloc[a[0, 0], a[:, 1]] = np.nan
-    return X, tmt_idx
-
-
-def ComputeBaselineErrors(X, d, nan_indices, ncomp=5):
-    """Compute error between baseline methods (i.e. average signal, minimum signal, zero, and PCA) and real value."""
-    pc = PCA(d, ncomp=ncomp, missing="fill-em", method='nipals', standardize=False, demean=False, normalize=False)
-    n = d.shape[0]
-    errors = np.empty((4, n), dtype=float)
-    for ii in range(n):
-        idx = nan_indices[d.index[ii]]
-        v = X[idx[0], idx[1] - 4]
-        avE = [d.iloc[ii, :][~np.isnan(d.iloc[ii, :])].mean()] * v.size
-        zeroE = [0.0] * v.size
-        minE = [d.iloc[ii, :][~np.isnan(d.iloc[ii, :])].min()] * v.size
-        pcaE = pc._adjusted_data[idx[0], idx[1] - 4]
-        assert all(~np.isnan(v)) and all(~np.isnan(avE)) and all(~np.isnan(zeroE)) and all(~np.isnan(minE)) and all(~np.isnan(pcaE)), (v, avE, zeroE, minE, pcaE)
-        errors[0, ii] = mean_squared_error(v, avE)
-        errors[1, ii] = mean_squared_error(v, zeroE)
-        errors[2, ii] = mean_squared_error(v, minE)
-        errors[3, ii] = mean_squared_error(v, pcaE)
-    return errors
-
-
-def ComputeModelError(X, data, nan_indices, model):
-    """Compute error between cluster center versus real value."""
-    ncl = model.ncl
-    labels = model.labels() - 1
-    centers = model.transform().T
-    n = data.shape[0]
-    errors = np.empty(n, dtype=float)
-    for ii in range(n):
-        idx = nan_indices[data.index[ii]]
-        v = X[idx[0], idx[1] - 4]
-        c = centers[labels[ii], idx[1] - 4]
-        assert all(~np.isnan(v)) and all(~np.isnan(c)), (v, c)
-        errors[ii] = mean_squared_error(v, c)
-    assert len(set(errors)) > 1, (centers, nan_indices[idx], v, c)
-    return errors
+    grid = {"ncl": n_clusters, "SeqWeight": [weight], "distance_method": [distance_method]}
+    df = ImputationBenchmark(grid, n_runs=n_runs, tmt=tmt, n_jobs=n_jobs)
+    return df[["N_Run", "Peptide_Idx", "Missingness", "Clusters", "DDMC", "Average", "Zero", "Minimum", "PCA"]]
+
+
+def ErrorAcrossWeights(distance_method, weights, ncl=20, n_runs=5, tmt=7, n_jobs=None):
+    """Calculate missingness error across different weights."""
+    grid = {"ncl": [ncl], "SeqWeight": weights, "distance_method": [distance_method]}
+    df = ImputationBenchmark(grid, n_runs=n_runs, tmt=tmt, n_jobs=n_jobs)
+    return df[["N_Run", "Peptide_Idx", "Missingness", "Weight", "DDMC", "Average", "Zero", "Minimum", "PCA"]]
 
 
 def ComputeCenters(gmm, ncl):
@@ -2,12 +2,10 @@
 This creates Figure 2: Validations
 """
 
-import pickle
 import numpy as np
 import pandas as pd
-import seaborn as sns
 from ..validations import preprocess_ebdt_mcf7
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 from .figure1 import plotPCA_scoresORloadings
 from .figure2 import plotPCA, plotDistanceToUpstreamKinase, plotMotifs, ShuffleClusters
 from .figureM5 import plot_NetPhoresScoreByKinGroup
@@ -18,6 +16,8 @@ from ..pre_processing import filter_NaNpeptides
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+
     # Get list of axis objects
     ax, f = getSetup((12, 12), (3, 3), multz={3: 1})
 
@@ -28,8 +28,7 @@ def makeFigure():
     sns.set(style="whitegrid", font_scale=1.2, color_codes=True, palette="colorblind", rc={"grid.linestyle": "dotted", "axes.linewidth": 0.6})
 
     x = preprocess_ebdt_mcf7()
-    with open('msresist/data/pickled_models/ebdt_mcf7_binom_CL20_W5', 'rb') as m:
-        model = pickle.load(m)
+    model = loadModel('msresist/data/pickled_models/ebdt_mcf7_binom_CL20_W5')
 
     centers = pd.DataFrame(model.transform())
     centers.columns = np.arange(model.ncl) + 1
@@ -59,8 +58,7 @@ def makeFigure():
     plotMotifs([erk2], axes=[ax[5]], titles=["ERK2"])
 
     # ERK2 prediction
-    with open('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2', 'rb') as p:
-        model_cptac = pickle.load(p)[0]
+    model_cptac = loadModel('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2')[0]
 
     s_pssms = ShuffleClusters([7, 9, 13, 21], model_cptac, additional=erk2)
     plotDistanceToUpstreamKinase(model_cptac, [7, 9, 13, 21], additional_pssms=s_pssms + [erk2], add_labels=["7_S", "9_S", "13_S", "21_S", "ERK2+_S", "ERK2+"], ax=ax[6:8], num_hits=1)
@@ -70,8 +68,9 @@ def makeFigure():
 
 def plotMCF7AKTclustermap():
     """Code to create hierarchical clustering of cluster 1 across treatments"""
-    with open('msresist/data/pickled_models/ebdt_mcf7_binom_CL20_W5', 'rb') as m:
-        model = pickle.load(m)
+    import seaborn as sns
+
+    model = loadModel('msresist/data/pickled_models/ebdt_mcf7_binom_CL20_W5')
     c1 = pd.DataFrame(model.transform()[:, 0])
     X = pd.read_csv("msresist/data/Validations/Computational/ebdt_mcf7.csv")
     index = [col.split("7.")[1].split(".")[0] for col in X.columns[2:]]
@@ -2,24 +2,21 @@
 This creates Figure 4: Predictive performance of DDMC clusters using different weights
 """
 
-import pickle
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import random
 from Bio.Align import substitution_matrices
 from numba import prange
-from sklearn.linear_model import LogisticRegressionCV
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_squared_error
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 from ..logistic_regression import plotROC
-from ..pre_processing import filter_NaNpeptides
+from ..pre_processing import filter_NaNpeptides, CPTACmotifs
 from .figure2 import plotMotifs
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+
     # Get list of axis objects
     ax, f = getSetup((16, 8), (2, 5), multz={0: 1})
 
@@ -40,7 +37,7 @@ def makeFigure():
     boxplot_TotalPositionEnrichment(models, ax[2])
 
     # Signaling data
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
     X = filter_NaNpeptides(X, tmt=2)
     X["labels0"] = models[0].labels()
     X["labels20"] = models[1].labels()
@@ -60,7 +57,7 @@ def makeFigure():
 
     # Plot Motifs
     clusters = [21, 18, 14]
-    pssms = [model.pssms()[clusters[ii]] for ii, model in enumerate(models)]
+    pssms = [model.pssm_frames()[clusters[ii]] for ii, model in enumerate(models)]
     plotMotifs(pssms, axes=ax[6:9], titles=["Data", "Mix", "Sequence"], yaxis=[0, 10])
 
     return f
@@ -68,8 +65,11 @@ def makeFigure():
 
 def plotAUCs(ax, return_models=False):
     """Plot mean AUCs per phenotype across weights."""
+    import seaborn as sns
+    from sklearn.linear_model import LogisticRegressionCV
+
     # Signaling
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
 
     # Genotype data
     mutations = pd.read_csv("msresist/data/MS/CPTAC/Patient_Mutations.csv")
@@ -86,10 +86,9 @@ def plotAUCs(ax, return_models=False):
     aucs = np.zeros((3, len(weights)), dtype=float)
     models = []
     for ii, w in enumerate(weights):
-        with open(path + str(w) + '_TMT2', 'rb') as m:
-            model = pickle.load(m)
-            if isinstance(model, list):
-                model = model[0]
+        model = loadModel(path + str(w) + '_TMT2')
+        if isinstance(model, list):
+            model = model[0]
 
         if return_models and w in [0, 25, 50]:
             models.append(model)
@@ -121,8 +120,11 @@ def plotAUCs(ax, return_models=False):
 
 def barplot_PeptideToClusterDistances(models, ax, n=3000):
     """Compute and plot p-signal-to-center and motif to cluster distance for n peptides across weights."""
+    import seaborn as sns
+    from sklearn.metrics import mean_squared_error
+
     # Import signaling data, select random peptides, and find cluster assignments
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
     X = filter_NaNpeptides(X, tmt=2)
     random_peptides = np.random.choice(list(np.arange(len(models[0].labels()))), n, replace=False)
     X["labels0"] = models[0].labels()
@@ -149,11 +151,11 @@ def barplot_PeptideToClusterDistances(models, ax, n=3000):
 
 def boxplot_TotalPositionEnrichment(models, ax):
     """Position enrichment of cluster PSSMs"""
+    import seaborn as sns
+
     enr = np.zeros((3, 24), dtype=float)
     for ii, model in enumerate(models):
-        pssms = model.pssms()
-        for jj in range(models[0].ncl):
-            enr[ii, jj] = np.sum(pssms[jj].sum().drop(5))
+        enr[ii, :] = np.sum(np.delete(model.pssms(), 5, axis=2), axis=(1, 2))
 
     enr = pd.DataFrame(enr)
     enr.columns = np.arange(models[0].ncl) + 1
@@ -165,6 +167,8 @@ def boxplot_TotalPositionEnrichment(models, ax):
 
 
 def plot_PeptideToClusterMSE(X, models, ax, peptide="MGRKEsEEELE", yaxis=False):
+    import seaborn as sns
+    from sklearn.metrics import mean_squared_error
     if not peptide:
         peptide = random.sample(list(np.arange(len(models[0].labels()))), 1)
         X = pd.DataFrame(X.iloc[peptide, :])
@@ -198,13 +202,15 @@ def plot_PeptideToClusterMSE(X, models, ax, peptide="MGRKEsEEELE", yaxis=False):
 
 def plot_PeptidePositionEnrichment(X, models, ax, peptide="MGRKEsEEELE"):
     """Plot total sequence enrichment of a particular peptide across models"""
+    import seaborn as sns
+
     X = pd.DataFrame(X.set_index("Sequence").loc[peptide, :]).T.reset_index()
     X.columns = ["Sequence"] + list(X.columns)[1:]
     labels = np.squeeze(X.loc[:, ["labels0", "labels20", "labels50"]].values.T)
     enr = np.zeros((3, 1), dtype=float)
     for ii, model in enumerate(models):
         pssms = model.pssms()
-        enr[ii, 0] = np.sum(pssms[labels[ii] - 1].sum().drop(5))
+        enr[ii, 0] = np.sum(np.delete(pssms[labels[ii] - 1], 5, axis=1))
 
     enr = pd.DataFrame(enr).T
     enr.columns = ["Data", "Mix", "Sequence"]
@@ -246,6 +252,8 @@ def find_patients_with_NATandTumor(X, label, conc=False):
 
 def TransformCenters(model, X):
     """For a given model, find centers and transform for regression."""
+    from sklearn.preprocessing import StandardScaler
+
     centers = pd.DataFrame(model.transform()).T
     centers.iloc[:, :] = StandardScaler(with_std=False).fit_transform(centers.iloc[:, :])
     centers = centers.T
@@ -279,6 +287,7 @@ def HotColdBehavior(centers):
 
 
 def PAMdistSeqtoClusters(seq, clusters, ax):
+    import seaborn as sns
     pam250 = substitution_matrices.load("PAM250")
     pam250m = np.ndarray(pam250.shape, dtype=np.int8)
     dists = []
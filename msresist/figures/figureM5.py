@@ -4,23 +4,21 @@ This creates Figure 5: Tumor vs NAT analysis
 
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import matplotlib
-import pickle
 import textwrap
 from scipy.stats import mannwhitneyu
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LogisticRegressionCV
-from sklearn.preprocessing import StandardScaler
-from statsmodels.stats.multitest import multipletests
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 from ..logistic_regression import plotClusterCoefficients, plotROC
 from ..figures.figure2 import plotPCA, plotMotifs, plotDistanceToUpstreamKinase
-from ..pre_processing import MeanCenter, filter_NaNpeptides
+from ..pre_processing import MeanCenter, filter_NaNpeptides, CPTACmotifs
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegressionCV
+
     # Get list of axis objects
     ax, f = getSetup((15, 13), (4, 4), multz={0: 1, 4: 1, 12: 1, 14: 1})
 
@@ -33,11 +31,10 @@ def makeFigure():
     matplotlib.rcParams['font.sans-serif'] = "Helvetica"
     matplotlib.rcParams['font.family'] = "sans-serif"
 
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
     X = filter_NaNpeptides(X, tmt=2)
 
-    with open('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2', 'rb') as p:
-        model = pickle.load(p)[0]
+    model = loadModel('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2')[0]
 
     # first plot heatmap of clusters
     ax[0].axis("off")
@@ -107,6 +104,8 @@ def makeFigure():
 
 def plotPeptidesByFeature(X, y, d, feat_labels, ax, loc='best', title=False, TwoCols=False, legend_size=8):
     """Plot and compare specific peptides by feature."""
+    import seaborn as sns
+
     x = X.set_index(["Gene", "Position"])
     n = list(d.keys())
     p = list(d.values())
@@ -154,6 +153,8 @@ def plotPeptidesByFeature(X, y, d, feat_labels, ax, loc='best', title=False, Two
 
 def plot_NetPhoresScoreByKinGroup(PathToFile, ax, n=5, title=False):
     """Plot top scoring kinase groups"""
+    import seaborn as sns
+
     NPtoCumScore = {}
     X = pd.read_csv(PathToFile)
     for ii in range(X.shape[0]):
@@ -175,6 +176,8 @@ def plot_NetPhoresScoreByKinGroup(PathToFile, ax, n=5, title=False):
 
 def plot_GO(cluster, ax, n=5, title=False, max_width=25, analysis="CPTAC"):
     """Plot top scoring gene ontologies in a cluster"""
+    import seaborn as sns
+
     X = pd.read_csv("msresist/data/cluster_analysis/" + str(analysis) + "_GO_C" + str(cluster) + ".csv")
     X = X[["GO biological process complete", "upload_1 (fold Enrichment)"]].iloc[:n, :]
     X.columns = ["Biological process", "Fold Enrichment"]
@@ -202,6 +205,8 @@ def TumorType(X):
 
 def plot_clusters_binaryfeatures(centers, id_var, ax, pvals=False, loc='best'):
     """Plot p-signal of binary features (tumor vs NAT or mutational status) per cluster """
+    import seaborn as sns
+
     ncl = centers.shape[1] - 1
     data = pd.melt(id_vars=id_var, value_vars=np.arange(ncl) + 1, value_name="p-signal", var_name="Cluster", frame=centers)
     sns.violinplot(x="Cluster", y="p-signal", hue=id_var, data=data, dodge=True, ax=ax, linewidth=0.5, fliersize=2)
@@ -221,6 +226,8 @@ def plot_clusters_binaryfeatures(centers, id_var, ax, pvals=False, loc='best'):
 
 def calculate_mannW_pvals(centers, col, feature1, feature2):
     """Compute Mann Whitney rank test p-values"""
+    from statsmodels.stats.multitest import multipletests
+
     pvals = []
     for ii in range(centers.shape[1] - 1):
         x = centers.iloc[:, [ii, -1]]
@@ -1,22 +1,22 @@
 """
 This creates Figure 6: STK11 analysis
 """
-import pickle
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from sklearn.linear_model import LogisticRegressionCV
-from sklearn.preprocessing import StandardScaler
-from ..pre_processing import filter_NaNpeptides
+from ..pre_processing import filter_NaNpeptides, CPTACmotifs
 from .figure2 import plotDistanceToUpstreamKinase
 from .figureM4 import find_patients_with_NATandTumor
 from .figureM5 import plot_clusters_binaryfeatures, build_pval_matrix, calculate_mannW_pvals, plot_GO, plotPeptidesByFeature
 from ..logistic_regression import plotROC, plotClusterCoefficients
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+    from sklearn.linear_model import LogisticRegressionCV
+    from sklearn.preprocessing import StandardScaler
+
     # Get list of axis objects
     ax, f = getSetup((12, 10), (3, 3), multz={0: 1, 3: 1})
 
@@ -31,8 +31,7 @@ def makeFigure():
     matplotlib.rcParams['font.family'] = "sans-serif"
 
     # Load Clustering Model from Figure 2
-    with open('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2', 'rb') as p:
-        model = pickle.load(p)[0]
+    model = loadModel('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2')[0]
 
     # Import Genotype data
     mutations = pd.read_csv("msresist/data/MS/CPTAC/Patient_Mutations.csv")
@@ -40,7 +39,7 @@ def makeFigure():
     y = mOI[~mOI["Sample.ID"].str.contains("IR")]
 
     # Find centers
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
     centers = pd.DataFrame(model.transform())
     centers.columns = np.arange(model.ncl) + 1
     centers["Patient_ID"] = X.columns[4:]
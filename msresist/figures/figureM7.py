@@ -2,22 +2,22 @@
 This creates Figure 7: Tumor infiltrating immune cells
 """
 
-import pickle
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import textwrap
-from sklearn.linear_model import LogisticRegressionCV
-from sklearn.preprocessing import StandardScaler
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 from .figureM5 import build_pval_matrix, calculate_mannW_pvals, plot_clusters_binaryfeatures, plotPeptidesByFeature
 from .figure2 import plotPCA, plotDistanceToUpstreamKinase
 from ..logistic_regression import plotROC, plotClusterCoefficients
-from ..pre_processing import filter_NaNpeptides
+from ..pre_processing import filter_NaNpeptides, CPTACmotifs
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+    from sklearn.linear_model import LogisticRegressionCV
+    from sklearn.preprocessing import StandardScaler
+
     # Get list of axis objects
     ax, f = getSetup((14, 13), (4, 3), multz={0: 1, 3: 1})
 
@@ -28,10 +28,9 @@ def makeFigure():
     subplotLabel(ax)
 
     # Import DDMC clusters
-    with open('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2', 'rb') as p:
-        model = pickle.load(p)[0]
+    model = loadModel('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2')[0]
 
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
     X = filter_NaNpeptides(X, tmt=2)
     centers = pd.DataFrame(model.transform())
     centers.columns = np.arange(model.ncl) + 1
@@ -115,6 +114,8 @@ def FormatXYmatrices(centers):
 
 def plot_ImmuneGOs(cluster, ax, title=False, max_width=25, n=False, loc='best'):
     """Plot immune-related GO"""
+    import seaborn as sns
+
     go = pd.read_csv("msresist/data/cluster_analysis/CPTAC_GO_C" + str(cluster) + ".csv")
     im = go[go["GO biological process complete"].str.contains("immune")]
     tc = go[go["GO biological process complete"].str.contains("T cell")]
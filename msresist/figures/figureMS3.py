@@ -2,19 +2,19 @@
 This creates Supplemental Figure 3: Predictive performance of DDMC clusters using different weights
 """
 
-import pickle
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from sklearn.linear_model import LogisticRegressionCV
-from sklearn.preprocessing import StandardScaler
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 from ..logistic_regression import plotROC
+from ..pre_processing import CPTACmotifs
 from .figureM4 import TransformCenters, HotColdBehavior, find_patients_with_NATandTumor, merge_binary_vectors
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+    from sklearn.linear_model import LogisticRegressionCV
+
     # Get list of axis objects
     ax, f = getSetup((15, 10), (3, 5))
 
@@ -25,7 +25,7 @@ def makeFigure():
     sns.set(style="whitegrid", font_scale=1.2, color_codes=True, palette="colorblind", rc={"grid.linestyle": "dotted", "axes.linewidth": 0.6})
 
     # Signaling
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
 
     # Genotype data
     mutations = pd.read_csv("msresist/data/MS/CPTAC/Patient_Mutations.csv")
@@ -40,8 +40,7 @@ def makeFigure():
     weights = [0, 15, 20, 40, 50]
     path = 'msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W'
     for ii, w in enumerate(weights):
-        with open(path + str(w) + '_TMT2', 'rb') as m:
-            model = pickle.load(m)[0]
+        model = loadModel(path + str(w) + '_TMT2')[0]
 
         # Find and scale centers
         centers_gen, centers_hcb = TransformCenters(model, X)
@@ -4,18 +4,19 @@ This creates Supplemental Figure 4: Predicting sample type with different modeli
 
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from sklearn.linear_model import LogisticRegressionCV
-from sklearn.cluster import KMeans
 from pomegranate import GeneralMixtureModel, NormalDistribution
 from .common import subplotLabel, getSetup
-from ..pre_processing import filter_NaNpeptides
+from ..pre_processing import filter_NaNpeptides, CPTACmotifs
 from ..logistic_regression import plotClusterCoefficients, plotROC
 from .figureM5 import plot_clusters_binaryfeatures, build_pval_matrix, calculate_mannW_pvals, TumorType
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+    from sklearn.linear_model import LogisticRegressionCV
+    from sklearn.cluster import KMeans
+
     # Get list of axis objects
     ax, f = getSetup((14, 10), (3, 4), multz={1: 2, 6: 1, 10: 1})
 
@@ -26,7 +27,7 @@ def makeFigure():
     subplotLabel(ax)
 
     # Tumor vs NAT unclustered
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
     X = filter_NaNpeptides(X, cut=1)
     X["Gene/Pos"] = X["Gene"] + ": " + X["Position"]
     d = X.set_index("Gene/Pos").select_dtypes(include=["float64"]).T.reset_index()
@@ -81,6 +82,8 @@ def makeFigure():
 
 def plot_unclustered_LRcoef(ax, lr, d, title=False):
     """Plot logistic regression coefficients of unclustered data"""
+    import seaborn as sns
+
     ws = lr.coef_[0]
     cdic = dict(zip(ws, d.columns))
     coefs = pd.DataFrame()
@@ -1,14 +1,11 @@
 """
 This creates Supplemental Figure 5: Predicting EGFRm/ALKf using DDMC clusters.
 """
-import pickle
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LogisticRegressionCV
 from ..logistic_regression import plotClusterCoefficients, plotROC
-from .common import subplotLabel, getSetup
+from ..pre_processing import CPTACmotifs
+from .common import subplotLabel, getSetup, loadModel
 from .figure2 import plotMotifs, plotDistanceToUpstreamKinase
 from .figureM4 import merge_binary_vectors, find_patients_with_NATandTumor
 from .figureM5 import plot_clusters_binaryfeatures, build_pval_matrix, calculate_mannW_pvals
@@ -16,6 +13,10 @@ from .figureM5 import plot_clusters_binaryfeatures, build_pval_matrix, calculate
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegressionCV
+
     # Get list of axis objects
     ax, f = getSetup((12, 9), (2, 2), multz={0: 1})
 
@@ -26,8 +27,7 @@ def makeFigure():
     sns.set(style="whitegrid", font_scale=1.2, color_codes=True, palette="colorblind", rc={"grid.linestyle": "dotted", "axes.linewidth": 0.6})
 
     # Load Clustering Model from Figure 2
-    with open('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2', 'rb') as p:
-        model = pickle.load(p)[0]
+    model = loadModel('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2')[0]
 
     # Import Genotype data
     mutations = pd.read_csv("msresist/data/MS/CPTAC/Patient_Mutations.csv")
@@ -35,7 +35,7 @@ def makeFigure():
     y = mOI[~mOI["Sample.ID"].str.contains("IR")]
 
     # Find centers
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
     centers = pd.DataFrame(model.transform())
     centers.columns = np.arange(model.ncl) + 1
     centers["Patient_ID"] = X.columns[4:]
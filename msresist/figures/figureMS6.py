@@ -2,23 +2,21 @@
 This creates Supplemental Figure 6: Predicting STK11 genotype using different clustering strategies.
 """
 
-import pickle
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from sklearn.linear_model import LogisticRegressionCV
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 from pomegranate import GeneralMixtureModel, NormalDistribution
 from msresist.clustering import MassSpecClustering
-from .common import subplotLabel, getSetup
-from ..pre_processing import filter_NaNpeptides
+from .common import subplotLabel, getSetup, loadModel
+from ..pre_processing import filter_NaNpeptides, CPTACmotifs
 from ..logistic_regression import plotROC
 from .figureM4 import find_patients_with_NATandTumor, merge_binary_vectors
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+    from sklearn.preprocessing import StandardScaler
+
     # Get list of axis objects
     ax, f = getSetup((20, 10), (2, 5))
 
@@ -29,7 +27,7 @@ def makeFigure():
     sns.set(style="whitegrid", font_scale=1.2, color_codes=True, palette="colorblind", rc={"grid.linestyle": "dotted", "axes.linewidth": 0.6})
 
     # Signaling
-    X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+    X = CPTACmotifs()
     X = filter_NaNpeptides(X, cut=1)
 
     # Fit DDMC to complete data
@@ -55,8 +53,7 @@ def makeFigure():
     centers_min = find_patients_with_NATandTumor(centers_min.copy(), "Patient_ID", conc=True)
 
     # Load full DDMC
-    with open('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2', 'rb') as p:
-        model = pickle.load(p)[0]
+    model = loadModel('msresist/data/pickled_models/binomial/CPTACmodel_BINOMIAL_CL24_W15_TMT2')[0]
 
     # Find and scale centers
     centers = pd.DataFrame(model.transform()).T
@@ -84,6 +81,10 @@ def makeFigure():
 
 def plot_ROCs(ax, centers, centers_min, X, y, gene_label):
     """Generate ROC plots using DDMC, unclustered, k-means, and GMM for a particular feature."""
+    from sklearn.linear_model import LogisticRegressionCV
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
     # LASSO
     lr = LogisticRegressionCV(cv=5, solver="saga", max_iter=100000, tol=1e-4, n_jobs=-1, penalty="elasticnet", l1_ratios=[0.1])
 
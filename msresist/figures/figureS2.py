@@ -3,7 +3,6 @@ This creates Supplemental Figure 2: Cell migration and island
 """
 
 import numpy as np
-import seaborn as sns
 from .common import subplotLabel, getSetup
 from .figure1 import IndividualTimeCourses, import_phenotype_data, barplot_UtErlAF154
 from ..distances import BarPlotRipleysK, PlotRipleysK
@@ -11,6 +10,8 @@ from ..distances import BarPlotRipleysK, PlotRipleysK
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+
     # Get list of axis objects
     ax, f = getSetup((15, 10), (4, 6), multz={0: 1, 12: 1})
 
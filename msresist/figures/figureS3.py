@@ -3,7 +3,6 @@ This creates Supplemental Figure 3: Specific phosphosites.
 """
 
 import pandas as pd
-import seaborn as sns
 from .common import subplotLabel, getSetup
 from ..pre_processing import preprocessing
 from .figure1 import plot_IdSites, plot_AllSites, plotPCA_scoresORloadings
@@ -15,6 +14,8 @@ all_lines = ["WT", "KO", "KD", "KI", "Y634F", "Y643F", "Y698F", "Y726F", "Y750F"
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+
     # Get list of axis objects
     ax, f = getSetup((12, 4), (1, 4))
 
@@ -1,12 +1,12 @@
 
-import pickle
-import seaborn as sns
-from .common import subplotLabel, getSetup
+from .common import subplotLabel, getSetup, loadModel
 from msresist.figures.figure2 import plotCenters, plotMotifs
 
 
 def makeFigure():
     """Get a list of the axis objects and create a figure"""
+    import seaborn as sns
+
     # Get list of axis objects
     ax, f = getSetup((12, 5), (2, 5))
 
@@ -17,8 +17,7 @@ def makeFigure():
     sns.set(style="whitegrid", font_scale=1, color_codes=True, palette="colorblind", rc={"grid.linestyle": "dotted", "axes.linewidth": 0.6})
 
     # Load DDMC
-    with open("msresist/data/pickled_models/AXLmodel_PAM250_W2-5_5CL", "rb") as m:
-        model = pickle.load(m)
+    model = loadModel("msresist/data/pickled_models/AXLmodel_PAM250_W2-5_5CL")
     centers = model.transform()
     lines = ["WT", "KO", "KD", "KI", "Y634F", "Y643F", "Y698F", "Y726F", "Y750F ", "Y821F"]
 
@@ -26,7 +25,7 @@ def makeFigure():
     plotCenters(ax[:5], model, lines)
 
     # Plot motifs
-    pssms = model.pssms(PsP_background=True)
+    pssms = model.pssm_frames(PsP_background=True)
     plotMotifs([pssms[0], pssms[1], pssms[2], pssms[3], pssms[4]], axes=ax[5:10], titles=["Cluster 1", "Cluster 2", "Cluster 3", "Cluster 4", "Cluster 5"], yaxis=[0, 11])
 
     return f
@@ -0,0 +1,172 @@
+""" Imputation benchmark: error of DDMC cluster centers versus baseline imputations on held-out TMT experiments. """
+
+import os
+import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from .clustering import MassSpecClustering
+from .pre_processing import filter_NaNpeptides, FindIdxValues, CPTACfile, CPTACmotifs, CacheDir, HashInputs, SaveTable, LoadTable
+
+
+GRID = ("ncl", "SeqWeight", "distance_method")
+BASELINES = ["Average", "Zero", "Minimum", "PCA"]
+
+
+def ImputationBenchmark(grid, n_runs=5, tmt=7, seed=0, checkpoint=None, n_jobs=None, engine="pomegranate", X=None, verbose=False):
+    """ Remove one TMT experiment per peptide in each of n_runs successive runs (the missingness accumulates across
+    runs) and fit DDMC for every combination of the grid's ncl, SeqWeight and distance_method lists in a process pool
+    of n_jobs workers. X is laid out as CPTACmotifs, which it defaults to. Every finished run and (run, ncl,
+    SeqWeight, distance_method) cell is saved to the checkpoint directory, by default in the user's cache directory
+    keyed by the CPTAC csv and the arguments, so an interrupted benchmark resumes where it stopped. Returns one row
+    per run, cell and peptide, also saved as results.npz in the checkpoint directory. """
+    cells = list(itertools.product(*[grid[key] for key in GRID]))
+    if X is None:
+        X = CPTACmotifs()
+        if checkpoint is None:
+            flags = (tuple(cells), n_runs, tmt, seed, engine)
+            checkpoint = os.path.join(CacheDir(), "imputation_%s" % HashInputs([CPTACfile + ".csv"], flags))
+    assert checkpoint is not None, "A checkpoint directory is needed to benchmark a table other than CPTACmotifs."
+    os.makedirs(checkpoint, exist_ok=True)
+
+    X = filter_NaNpeptides(X, tmt=tmt)
+    X.index = np.arange(X.shape[0])
+    runs = PrepareRuns(X, n_runs, seed, checkpoint)
+    values = os.path.join(checkpoint, "values.npy")
+
+    todo = [(ii, cell) for ii in range(n_runs) for cell in cells if not os.path.exists(CellFile(checkpoint, ii, cell))]
+    if todo:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = {executor.submit(FitCell, values, runs[ii], CellFile(checkpoint, ii, cell), cell, seed + ii, engine): (ii, cell) for ii, cell in todo}
+            for nn, future in enumerate(as_completed(futures)):
+                future.result()
+                if verbose:
+                    print("Done %d/%d: run %d, ncl %s, SeqWeight %s, %s" % ((nn + 1, len(todo), futures[future][0]) + futures[future][1]))
+
+    results = []
+    for ii in range(n_runs):
+        md, _, missingness, baseline_errors = LoadRun(runs[ii])
+        for ncl, w, distance_method in cells:
+            df = pd.DataFrame({"N_Run": ii, "Peptide_Idx": md.index.values, "Missingness": missingness, "Clusters": ncl, "Weight": w, "Distance": distance_method})
+            df["DDMC"] = np.load(CellFile(checkpoint, ii, (ncl, w, distance_method)))
+            for jj, baseline in enumerate(BASELINES):
+                df[baseline] = baseline_errors[jj]
+            results.append(df)
+    results = pd.concat(results, ignore_index=True)
+    SaveTable(results, os.path.join(checkpoint, "results.npz"))
+    return results
+
+
+def PrepareRuns(X, n_runs, seed, checkpoint):
+    """ Mask the data of each run, building on the previous run, and compute its baseline errors. Runs already in
+    the checkpoint directory are reused, so resumed cells see the same missing values. Returns the run files. """
+    md = X.copy()
+    values = X.select_dtypes(include=["float64"]).values
+    np.save(os.path.join(checkpoint, "values.npy"), values)
+    runs = [os.path.join(checkpoint, "run%d.npz" % ii) for ii in range(n_runs)]
+    for ii, fname in enumerate(runs):
+        if os.path.exists(fname):
+            md = LoadRun(fname)[0].copy()
+            continue
+        md, nan_indices = IncorporateMissingValues(md, FindIdxValues(md), random.Random("%d-%d" % (seed, ii)))
+        data = md.select_dtypes(include=["float64"]).T
+        missingness = (np.count_nonzero(np.isnan(data), axis=0) / data.shape[0] * 100).astype(float)
+        baseline_errors = ComputeBaselineErrors(values, data.T, nan_indices)
+        SaveRun(fname, md, nan_indices, missingness, baseline_errors)
+    return runs
+
+
+def SaveRun(fname, md, nan_indices, missingness, baseline_errors):
+    """ Save a masked run: the table, which values were removed, and the baseline errors. """
+    SaveTable(md, fname[:-4] + "_table.npz")
+    cols = [cc for _, cc in nan_indices]
+    tmp = "%s.%d.npz" % (fname[:-4], os.getpid())
+    np.savez(tmp, rows=np.array([rr for rr, _ in nan_indices]), counts=np.array([len(cc) for cc in cols]), cols=np.concatenate(cols), missingness=missingness, baseline=baseline_errors)
+    os.replace(tmp, fname)
+
+
+@lru_cache(maxsize=None)
+def LoadRun(fname):
+    """ The masked table, removed values, missingness and baseline errors of a saved run. Memoized per process. """
+    md = LoadTable(fname[:-4] + "_table.npz")
+    with np.load(fname) as data:
+        nan_indices = list(zip(data["rows"], np.split(data["cols"], np.cumsum(data["counts"])[:-1])))
+        return md, nan_indices, data["missingness"], data["baseline"]
+
+
+def CellFile(checkpoint, run, cell):
+    """ Checkpoint file holding the DDMC errors of one run and (ncl, SeqWeight, distance_method) cell. """
+    return os.path.join(checkpoint, "run%d_ncl%s_w%s_%s.npy" % ((run,) + tuple(cell)))
+
+
+def FitCell(values, run, fname, cell, seed, engine="pomegranate"):
+    """ Fit DDMC to one masked run and save its per-peptide imputation errors against the unmasked values. """
+    ncl, w, distance_method = cell
+    md, nan_indices, _, _ = LoadRun(run)
+    X = np.load(values, mmap_mode="r")
+    data = md.select_dtypes(include=["float64"]).T
+    info = md.select_dtypes(include=["object"])
+
+    np.random.seed(seed)
+    model = MassSpecClustering(info, ncl, w, distance_method, engine=engine).fit(data, nRepeats=0)
+    errors = ComputeModelError(X, data.T, nan_indices, model)
+
+    tmp = "%s.%d.npy" % (fname[:-4], os.getpid())
+    np.save(tmp, errors)
+    os.replace(tmp, fname)
+
+
+def IncorporateMissingValues(X, vals, rng=random):
+    """Remove a random TMT experiment for each peptide. If a peptide already has the maximum amount of
+    missingness allowed, don't remove."""
+    d = X.select_dtypes(include=["float64"])
+    tmt_idx = []
+    for ii in range(d.shape[0]):
+        tmt = rng.sample(sorted(set(vals[vals[:, 0] == ii][:, -1])), 1)[0]
+        a = vals[(vals[:, -1] == tmt) & (vals[:, 0] == ii)]
+        tmt_idx.append((a[0, 0], a[:, 1]))
+        X.iloc[a[0, 0], a[:, 1]] = np.nan
+    return X, tmt_idx
+
+
+def ComputeBaselineErrors(X, d, nan_indices, ncomp=5):
+    """Compute error between baseline methods (i.e. average signal, minimum signal, zero, and PCA) and real value."""
+    from sklearn.metrics import mean_squared_error
+    from statsmodels.multivariate.pca import PCA
+
+    pc = PCA(d, ncomp=ncomp, missing="fill-em", method='nipals', standardize=False, demean=False, normalize=False)
+    n = d.shape[0]
+    errors = np.empty((4, n), dtype=float)
+    for ii in range(n):
+        idx = nan_indices[d.index[ii]]
+        v = X[idx[0], idx[1] - 4]
+        avE = [d.iloc[ii, :][~np.isnan(d.iloc[ii, :])].mean()] * v.size
+        zeroE = [0.0] * v.size
+        minE = [d.iloc[ii, :][~np.isnan(d.iloc[ii, :])].min()] * v.size
+        pcaE = pc._adjusted_data[idx[0], idx[1] - 4]
+        assert all(~np.isnan(v)) and all(~np.isnan(avE)) and all(~np.isnan(zeroE)) and all(~np.isnan(minE)) and all(~np.isnan(pcaE)), (v, avE, zeroE, minE, pcaE)
+        errors[0, ii] = mean_squared_error(v, avE)
+        errors[1, ii] = mean_squared_error(v, zeroE)
+        errors[2, ii] = mean_squared_error(v, minE)
+        errors[3, ii] = mean_squared_error(v, pcaE)
+    return errors
+
+
+def ComputeModelError(X, data, nan_indices, model):
+    """Compute error between cluster center versus real value."""
+    from sklearn.metrics import mean_squared_error
+
+    labels = model.labels() - 1
+    centers = model.transform().T
+    n = data.shape[0]
+    errors = np.empty(n, dtype=float)
+    for ii in range(n):
+        idx = nan_indices[data.index[ii]]
+        v = X[idx[0], idx[1] - 4]
+        c = centers[labels[ii], idx[1] - 4]
+        assert all(~np.isnan(v)) and all(~np.isnan(c)), (v, c)
+        errors[ii] = mean_squared_error(v, c)
+    assert len(set(errors)) > 1, (centers, nan_indices[idx], v, c)
+    return errors
@@ -2,17 +2,14 @@
 
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy.stats import sem
-from sklearn.metrics import confusion_matrix
-from sklearn.metrics import auc
-from sklearn.metrics import plot_roc_curve
-from sklearn.model_selection import StratifiedKFold
 
 
 def plotClusterCoefficients(ax, lr, hue=None, xlabels=False, title=False):
     """Plot LR coeficients of clusters."""
+    import seaborn as sns
+
     coefs_ = pd.DataFrame(lr.coef_.T, columns=["LR Coefficient"])
     if hue:
         coefs_["Cluster"] = [l.split("_")[0] for l in hue]
@@ -31,6 +28,8 @@ def plotClusterCoefficients(ax, lr, hue=None, xlabels=False, title=False):
 
 def plotPredictionProbabilities(ax, lr, dd, yy):
     """Plot LR predictions and prediction probabilities."""
+    import seaborn as sns
+
     res_ = pd.DataFrame()
     res_["y, p(x)"] = lr.predict_proba(dd)[:, 1]
     z = lr.predict(dd) == yy
@@ -44,6 +43,8 @@ def plotPredictionProbabilities(ax, lr, dd, yy):
 
 def plotConfusionMatrix(ax, lr, dd, yy):
     """Actual vs predicted outputs"""
+    from sklearn.metrics import confusion_matrix
+
     cm = confusion_matrix(yy, lr.predict(dd))
     n = lr.classes_.shape[0]
     ax.imshow(cm)
@@ -59,6 +60,9 @@ def plotConfusionMatrix(ax, lr, dd, yy):
 
 def plotROC(ax, classifier, d, y, cv_folds=4, title=False, return_mAUC=False):
     """Plot Receiver Operating Characteristc with cross-validation folds of a given classifier model."""
+    from sklearn.metrics import auc, plot_roc_curve
+    from sklearn.model_selection import StratifiedKFold
+
     y = y.values
     cv = StratifiedKFold(n_splits=cv_folds)
     tprs = []
@@ -2,12 +2,16 @@
 
 import os
 import re
+import shutil
+from functools import lru_cache
+import numpy as np
 from Bio import SeqIO
 from Bio.Seq import Seq
 from .binomial import AAlist
 
 
 path = os.path.dirname(os.path.abspath(__file__))
+ProteomeFile = os.path.join(path, "data/Sequence_analysis/proteome_uniprot2019.fa")
 
 
 def MapMotifs(X, names):
@@ -49,6 +53,174 @@ def DictProteomeNameToSeq(X, n):
     return DictProtToSeq_UP
 
 
+class ProteomeIndex:
+    """ Read-only name-to-sequence mapping with a k-mer index over the proteome. The protein sequences are
+    concatenated as bytes, each followed by a newline, and names map to records of that concatenation. Every
+    k-mer is packed into an integer (5 bits per residue) and the codes are sorted along with their offsets, so
+    all candidate locations of a peptide are found with one binary search and then checked in full. """
+
+    def __init__(self, names, records, starts, proteome, k=6, kmers=None, positions=None):
+        self.names = [str(name) for name in names]
+        self.records = records
+        self.starts = starts
+        self.proteome = proteome
+        self.k = k
+        self.index = {name: ii for ii, name in enumerate(self.names)}
+
+        if kmers is None:
+            codes = KmerCodes(proteome, k)
+            positions = np.argsort(codes, kind="stable").astype(np.int32)
+            kmers = codes[positions]
+        self.kmers = kmers
+        self.positions = positions
+
+    @classmethod
+    def fromDict(cls, ProteomeDict, k=6):
+        """ Index a dictionary of protein name-sequence pairs, keeping its order. """
+        seqs = [str(seq) for seq in ProteomeDict.values()]
+        starts = np.cumsum([0] + [len(seq) + 1 for seq in seqs])
+        proteome = np.frombuffer("".join(seq + "\n" for seq in seqs).encode(), dtype=np.uint8)
+        return cls(ProteomeDict.keys(), np.arange(len(seqs)), starts, proteome, k)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name):
+        return self.sequence(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def sequence(self, name):
+        """ Sequence of a protein. """
+        rec = self.records[self.index[name]]
+        return self.proteome[self.starts[rec]: self.starts[rec + 1] - 1].tobytes().decode()
+
+    def find(self, peptides):
+        """ Offsets in the concatenated proteome of every occurrence of each (uppercase) peptide, in order. """
+        peptides = [pep.encode() for pep in peptides]
+        indexed = [ii for ii, pep in enumerate(peptides) if len(pep) >= self.k]
+        codes = KmerCodes(np.frombuffer(b"".join(peptides[ii][:self.k] for ii in indexed), dtype=np.uint8), self.k)[::self.k]
+        lo, hi = np.searchsorted(self.kmers, codes, side="left"), np.searchsorted(self.kmers, codes, side="right")
+
+        hits = [np.empty(0, dtype=np.int64)] * len(peptides)
+        for ii, start, end in zip(indexed, lo, hi):
+            pep = peptides[ii]
+            cand = np.sort(self.positions[start:end])
+            hits[ii] = np.array([pos for pos in cand if self.proteome[pos: pos + len(pep)].tobytes() == pep], dtype=np.int64)
+
+        # Peptides shorter than k are rare, so scan for them directly
+        short = [ii for ii, pep in enumerate(peptides) if len(pep) < self.k]
+        if short:
+            raw = self.proteome.tobytes()
+            for ii in short:
+                hits[ii] = np.array([m.start() for m in re.finditer(b"(?=" + re.escape(peptides[ii]) + b")", raw)], dtype=np.int64)
+        return hits
+
+    def locate(self, names, peptides):
+        """ Map each peptide to a protein and the offset of its first occurrence there. The named protein is used
+        when it contains the peptide, otherwise the first protein in name order that does; the name is None if
+        none does. """
+        hits = self.find([pep.upper() for pep in peptides])
+        rank = np.full(self.starts.size - 1, len(self.names))
+        rank[self.records] = np.arange(len(self.names))
+
+        proteins, offsets = [], []
+        for name, pos in zip(names, hits):
+            name = name.strip()
+            ranks = rank[np.searchsorted(self.starts, pos, side="right") - 1]
+            if name not in self.index or not np.any(ranks == self.index[name]):
+                if not np.any(ranks < len(self.names)):
+                    proteins.append(None)
+                    offsets.append(-1)
+                    continue
+                name = self.names[np.min(ranks)]
+            pp = pos[np.argmax(ranks == self.index[name])]
+            proteins.append(name)
+            offsets.append(int(pp - self.starts[self.records[self.index[name]]]))
+        return proteins, offsets
+
+
+def KmerCodes(seq, k):
+    """ Pack the k-mer starting at each offset of a uint8 sequence into an integer, 5 bits per residue. """
+    lookup = np.zeros(256, dtype=np.uint32)
+    lookup[np.arange(ord("A"), ord("Z") + 1)] = np.arange(1, 27)
+    vals = lookup[seq]
+    codes = np.zeros(max(vals.size - k + 1, 0), dtype=np.uint32)
+    for jj in range(k):
+        codes = (codes << 5) | vals[jj: jj + codes.size]
+    return codes
+
+
+@lru_cache(maxsize=None)
+def UniprotProteome(n="gene"):
+    """ Uniprot's proteome keyed by gene ("gene") or full protein name ("full"), with the same entries as
+    DictProteomeNameToSeq, as a ProteomeIndex over the memory-mapped ProteomeStore. """
+    store = ProteomeStore()
+    return ProteomeIndex(store[n + "Names"], store[n + "Records"], store["starts"], store["proteome"], kmers=store["kmers"], positions=store["positions"])
+
+
+@lru_cache(maxsize=None)
+def ProteomeStore():
+    """ Uniprot's proteome as memory-mapped arrays: the concatenated sequence bytes, the offset of each record,
+    the gene and full name tables pointing to records, and the sorted k-mer index. The fasta file is parsed once
+    and saved next to it, and rebuilt if the fasta file is newer. Processes share the arrays through the page cache. """
+    store = ProteomeFile + ".store"
+
+    if not StoreIsCurrent(store, ProteomeFile):
+        seqs, tables = [], {"gene": {}, "full": {}}
+        for ii, rec in enumerate(SeqIO.parse(ProteomeFile, "fasta")):
+            seqs.append(str(rec.seq))
+            if " GN=" in rec.description:
+                tables["gene"][rec.description.split(" GN=")[1].split(" ")[0]] = ii
+            if "HUMAN " in rec.description:
+                tables["full"][rec.description.split("HUMAN ")[1].split(" OS")[0]] = ii
+
+        index = ProteomeIndex.fromDict(dict(enumerate(seqs)))
+        arrays = {"proteome": index.proteome, "starts": index.starts, "kmers": index.kmers, "positions": index.positions}
+        for n, table in tables.items():
+            arrays[n + "Names"] = np.array(list(table.keys()), dtype=str)
+            arrays[n + "Records"] = np.array(list(table.values()), dtype=np.int64)
+
+        tmp = "%s.%d" % (store, os.getpid())
+        os.makedirs(tmp)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), arr)
+        PublishStore(tmp, store, ProteomeFile)
+
+    names = ["proteome", "starts", "kmers", "positions", "geneNames", "geneRecords", "fullNames", "fullRecords"]
+    return {name: np.load(os.path.join(store, name + ".npy"), mmap_mode="r") for name in names}
+
+
+def StoreIsCurrent(store, source):
+    """ Whether the store directory exists and is newer than its source file. """
+    return os.path.exists(store) and os.path.getmtime(store) >= os.path.getmtime(source)
+
+
+def PublishStore(tmp, store, source):
+    """ Move a freshly built store directory into place. Processes building the same store concurrently race to
+    rename theirs; the first one wins and the others discard their copy. A stale store is first renamed aside, so
+    no process opens its files by path while it is removed (arrays already memory-mapped stay valid). """
+    try:
+        os.rename(tmp, store)
+        return
+    except OSError:
+        if StoreIsCurrent(store, source):
+            shutil.rmtree(tmp)
+            return
+
+    old = "%s.old.%d" % (store, os.getpid())
+    try:
+        os.rename(store, old)
+    except OSError:
+        pass  # another process moved it first
+    try:
+        os.rename(tmp, store)
+    except OSError:
+        shutil.rmtree(tmp)  # another process published a current store in the meantime
+    shutil.rmtree(old, ignore_errors=True)
+
+
 def getKeysByValue(dictOfElements, valueToFind):
     """ Find the key of a given value within a dictionary. """
     listOfKeys = list()
@@ -59,48 +231,46 @@ def getKeysByValue(dictOfElements, valueToFind):
     return listOfKeys
 
 
-def MatchProtNames(ProteomeDict, MS_names, MS_seqs):
-    """ Match protein names of MS and Uniprot's proteome. """
-    matchedNames, seqs, Xidx = [], [], []
+def MatchProtNames(ProteomeDict, MS_names, MS_seqs, index=None):
+    """ Match protein names of MS and Uniprot's proteome. Peptides are looked up together in a ProteomeIndex,
+    built from ProteomeDict unless given. Returns four lists: the matched protein names, the peptides, their row
+    positions in MS_seqs, and the offset of each peptide in its protein. """
+    if index is None:
+        index = ProteomeIndex.fromDict(ProteomeDict)
+    proteins, offsets = index.locate(MS_names, MS_seqs)
+
+    matchedNames, seqs, Xidx, matchedOffsets = [], [], [], []
     counter = 0
     for i, MS_seq in enumerate(MS_seqs):
-        MS_seqU = MS_seq.upper()
-        MS_name = MS_names[i].strip()
-        if MS_name in ProteomeDict and MS_seqU in ProteomeDict[MS_name]:
-            Xidx.append(i)
-            seqs.append(MS_seq)
-            matchedNames.append(MS_name)
-        else:
-            try:
-                newname = getKeysByValue(ProteomeDict, MS_seqU)[0]
-                assert MS_seqU in ProteomeDict[newname]
-                Xidx.append(i)
-                seqs.append(MS_seq)
-                matchedNames.append(newname)
-            except BaseException:
-                print(MS_name, MS_seqU)
-                counter += 1
-                continue
+        if proteins[i] is None:
+            print(MS_names[i].strip(), MS_seq.upper())
+            counter += 1
+            continue
+        Xidx.append(i)
+        seqs.append(MS_seq)
+        matchedNames.append(proteins[i])
+        matchedOffsets.append(offsets[i])
 
     assert counter == 0, "Proteome is missing %s peptides" % (counter)
     assert len(matchedNames) == len(seqs)
-    return matchedNames, seqs, Xidx
+    return matchedNames, seqs, Xidx, matchedOffsets
 
 
-def findmotif(MS_seq, MS_name, ProteomeDict, motif_size):
+def findmotif(MS_seq, MS_name, ProteomeDict, motif_size, offset=None):
     """ For a given MS peptide, finds it in the ProteomeDict, and maps the +/-5 AA from the p-site, accounting
-    for peptides phosphorylated multiple times concurrently. """
+    for peptides phosphorylated multiple times concurrently. The offset of the peptide in the protein can be
+    passed if already known. """
     MS_seqU = MS_seq.upper()
     try:
         UP_seq = ProteomeDict[MS_name]
         assert MS_seqU in UP_seq, "check " + MS_name + " with seq " + MS_seq + ". Protein sequence found: " + UP_seq
-        regexPattern = re.compile(MS_seqU)
-        MatchObs = list(regexPattern.finditer(UP_seq))
+        if offset is None:
+            offset = UP_seq.find(MS_seqU)
         if "y" in MS_seq:
             pY_idx = list(re.compile("y").finditer(MS_seq))
             assert len(pY_idx) != 0
             center_idx = pY_idx[0].start()
-            y_idx = center_idx + MatchObs[0].start()
+            y_idx = center_idx + offset
             DoS_idx = None
             if len(pY_idx) > 1:
                 DoS_idx = pY_idx[1:]
@@ -118,7 +288,7 @@ def findmotif(MS_seq, MS_name, ProteomeDict, motif_size):
             pTS_idx = list(re.compile("t|s").finditer(MS_seq))
             assert len(pTS_idx) != 0
             center_idx = pTS_idx[0].start()
-            ts_idx = center_idx + MatchObs[0].start()
+            ts_idx = center_idx + offset
             DoS_idx = None
             if len(pTS_idx) > 1:
                 DoS_idx = pTS_idx[1:]
@@ -138,18 +308,16 @@ def findmotif(MS_seq, MS_name, ProteomeDict, motif_size):
 def GeneratingKinaseMotifs(names, seqs):
     """ Main function to generate motifs using 'findmotif'. """
     motif_size = 5
-    proteome = open(os.path.join(path, "./data/Sequence_analysis/proteome_uniprot2019.fa"), "r")
-    ProteomeDict = DictProteomeNameToSeq(proteome, n="gene")
-    protnames, seqs, Xidx = MatchProtNames(ProteomeDict, names, seqs)
+    ProteomeDict = UniprotProteome(n="gene")
+    protnames, seqs, Xidx, offsets = MatchProtNames(ProteomeDict, names, seqs, ProteomeDict)
     MS_names, mapped_motifs, uni_pos, = [], [], []
 
     for i, MS_seq in enumerate(seqs):
-        pos, mappedMotif = findmotif(MS_seq, protnames[i], ProteomeDict, motif_size)
+        pos, mappedMotif = findmotif(MS_seq, protnames[i], ProteomeDict, motif_size, offsets[i])
         MS_names.append(protnames[i])
         mapped_motifs.append(mappedMotif)
         uni_pos.append(pos)
 
-    proteome.close()
     return MS_names, mapped_motifs, uni_pos, Xidx
 
 
@@ -1,23 +1,27 @@
 """PAM250 matrix to compute sequence distance between sequences and clusters."""
 
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 import scipy.stats as sp
 import scipy.special as sc
-from Bio.Align import substitution_matrices
 from numba import njit, prange
 from pomegranate.distributions import CustomDistribution
+from .binomial import OneHotMotifs
 
 
 class PAM250(CustomDistribution):
+    """ Average PAM250 similarity of each peptide to the peptides of a cluster. By default the background is the
+    (encoded motifs, PAM250 matrix) pair and the weighted average is factorized by position, so the N x N matrix of
+    pairwise scores is never built. A dense matrix from MotifPam250Scores can still be passed as background. """
+
     def __init__(self, seqs, SeqWeight, background=None):
         self.background = background
 
         if background is None:
-            # Compute all pairwise distances
-            self.background = MotifPam250Scores(seqs)
+            self.background = PAM250Background(tuple(seqs))
 
-        super().__init__(self.background.shape[0])
+        super().__init__(len(seqs))
         self.seqs = seqs
         self.name = "PAM250"
         self.SeqWeight = SeqWeight
@@ -32,10 +36,38 @@ class PAM250(CustomDistribution):
 
     def from_summaries(self, inertia=0.0):
         """ Update the underlying distribution. No inertia used. """
-        if np.sum(self.weightsIn) == 0.0:
-            self.logWeights[:] = self.SeqWeight * np.average(self.background, axis=0)
+        weights = self.weightsIn
+        if np.sum(weights) == 0.0:
+            weights = np.ones_like(weights)
+
+        if isinstance(self.background, tuple):
+            self.logWeights[:] = self.SeqWeight * factorizedAverage(self.background[0], self.background[1], weights)
+        else:
+            self.logWeights[:] = self.SeqWeight * np.average(self.background, weights=weights, axis=0)
+
+    def encode(self, seqs):
+        """ Encode motifs the way this distribution stores them. """
+        return EncodePam250([s.upper() for s in seqs])[0]
+
+    def batch_logWeights(self, weights, motifs=None):
+        """ Update all clusters at once from the (N, K) responsibilities and return the (N, K)
+        sequence log-likelihoods. Clusters without weight use the unweighted average, as in from_summaries.
+        If encoded motifs are given, score those peptides against the clusters instead. """
+        weights = np.where(np.sum(weights, axis=0) == 0.0, 1.0, weights)
+
+        if not isinstance(self.background, tuple):
+            if motifs is None:
+                return self.SeqWeight * np.dot(self.background.T, weights) / np.sum(weights, axis=0)
+            seqs, pam250m = EncodePam250(self.seqs)
         else:
-            self.logWeights[:] = self.SeqWeight * np.average(self.background, weights=self.weightsIn, axis=0)
+            seqs, pam250m = self.background
+        onehot = OneHotMotifs(seqs, pam250m.shape[0])
+        counts = (onehot.T @ weights).reshape(seqs.shape[1], pam250m.shape[0], -1)
+        table = np.einsum("pak,ab->pbk", counts, pam250m).reshape(onehot.shape[1], -1)
+
+        if motifs is not None:
+            onehot = OneHotMotifs(motifs, pam250m.shape[0])
+        return self.SeqWeight * (onehot @ table) / np.sum(weights, axis=0)
 
 
 class fixedMotif(CustomDistribution):
@@ -64,6 +96,17 @@ class fixedMotif(CustomDistribution):
         """ Update the underlying distribution. No inertia used. """
         self.logWeights[:] = self.SeqWeight * self.background
 
+    def encode(self, seqs):
+        """ Encode motifs the way this distribution stores them. """
+        return np.delete(EncodePam250([s.upper() for s in seqs])[0], [5, 10], axis=1)  # P0 and P+5 are not in PSPL motifs
+
+    def batch_logWeights(self, weights, motifs=None):
+        """ The motif is fixed, so every cluster column gets the same log-likelihood. """
+        background = self.background
+        if motifs is not None:
+            background = np.sum(self.motif[motifs, np.arange(motifs.shape[1])], axis=1)
+        return np.tile(self.SeqWeight * background[:, np.newaxis], (1, weights.shape[1]))
+
 
 def unpackPAM(seqs, sw, lw, frozen):
     """Unpack from pickling."""
@@ -83,20 +126,54 @@ def unpackFixed(seqs, motif, sw, lw, frozen):
     return clss
 
 
-def MotifPam250Scores(seqs):
-    """ Calculate and store all pairwise pam250 distances before starting. """
+@lru_cache(maxsize=8)
+def PAM250Background(seqs):
+    """EncodePam250 memoized on the sequence tuple, so PAM250 distributions built on the same peptides in this
+    process share one read-only background."""
+    background = EncodePam250(seqs)
+    for arr in background:
+        arr.flags.writeable = False
+    return background
+
+
+def EncodePam250(seqs):
+    """ Encode motifs as indices into the PAM250 alphabet and return them with the PAM250 matrix. """
+    from Bio.Align import substitution_matrices
+
     pam250 = substitution_matrices.load("PAM250")
-    seqs = np.array([[pam250.alphabet.find(aa) for aa in seq] for seq in seqs], dtype=np.intp)
 
-    # WARNING this type can only hold -128 to 127
-    out = np.zeros((seqs.shape[0], seqs.shape[0]), dtype=np.int8)
-    pam250m = np.ndarray(pam250.shape, dtype=np.int8)
+    # Residues missing from the alphabet map to the last entry, the same wrap-around as indexing with find()'s -1
+    lookup = np.full(256, len(pam250.alphabet) - 1, dtype=np.intp)
+    for ii, aa in enumerate(pam250.alphabet):
+        lookup[ord(aa)] = ii
+    seqs = lookup[np.frombuffer("".join(seqs).encode(), dtype=np.uint8)].reshape(len(seqs), -1)
 
     # Move to a standard Numpy array
+    pam250m = np.ndarray(pam250.shape, dtype=np.int8)
     for ii in range(pam250m.shape[0]):
         for jj in range(pam250m.shape[1]):
             pam250m[ii, jj] = pam250[ii, jj]
 
+    return seqs, pam250m
+
+
+def factorizedAverage(seqs, pam250m, weights):
+    """ Weighted average over peptides i of the PAM250 score between peptide i and every peptide j.
+    The score is a sum over positions, so the average equals sum_p (counts_p @ PAM250)[seqs[j, p]] / sum(w),
+    where counts_p are the weighted residue counts at position p. This is O(N * positions * 24). """
+    nAA = pam250m.shape[0]
+    flat = seqs + nAA * np.arange(seqs.shape[1])
+    counts = np.bincount(flat.ravel(), weights=np.repeat(weights, seqs.shape[1]), minlength=nAA * seqs.shape[1])
+    table = counts.reshape(seqs.shape[1], nAA) @ pam250m
+    return np.sum(table.ravel()[flat], axis=1) / np.sum(weights)
+
+
+def MotifPam250Scores(seqs):
+    """ Calculate and store all pairwise pam250 distances before starting. """
+    seqs, pam250m = EncodePam250(seqs)
+
+    # WARNING this type can only hold -128 to 127
+    out = np.zeros((seqs.shape[0], seqs.shape[0]), dtype=np.int8)
     out = distanceCalc(out, seqs, pam250m)
 
     i_upper = np.triu_indices_from(out, k=1)
@@ -104,7 +181,7 @@ def MotifPam250Scores(seqs):
     return out
 
 
-@njit(parallel=True)
+@njit(parallel=True, cache=True)
 def distanceCalc(out, seqs, pam250m):
     """ Perform all the pairwise distances, with Numba JIT. """
     for ii in prange(seqs.shape[0]):  # pylint: disable=not-an-iterable
@@ -1,5 +1,7 @@
 """ Hyperparameter Tuning using GridSearch. """
 
+from shutil import rmtree
+from tempfile import mkdtemp
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import GridSearchCV
@@ -12,17 +14,23 @@ from msresist.clustering import MassSpecClustering
 
 
 def MSclusPLSR_tuning(X, info, Y, distance_method):
-    """ Cross-validation: Simultaneous hyperparameter search. """
-    MSclusPLSR = Pipeline(
-        [
-            ("MSclustering", MassSpecClustering(info=info, distance_method=distance_method, ncl=2, SeqWeight=0)),
-            ("plsr", PLSRegression(n_components=2)),
-        ]
-    )
-    param_grid = set_ClusterPLSRgrid()
-
-    grid = GridSearchCV(MSclusPLSR, param_grid=param_grid, cv=X.shape[0], return_train_score=True, scoring="neg_mean_squared_error")
-    fit = grid.fit(X, Y)
+    """ Cross-validation: Simultaneous hyperparameter search. The clustering step is cached by the pipeline, so it
+    is fit once per fold, ncl and SeqWeight and reused across plsr__n_components values. """
+    cachedir = mkdtemp()
+    try:
+        MSclusPLSR = Pipeline(
+            [
+                ("MSclustering", MassSpecClustering(info=info, distance_method=distance_method, ncl=2, SeqWeight=0)),
+                ("plsr", PLSRegression(n_components=2)),
+            ],
+            memory=cachedir,
+        )
+        param_grid = set_ClusterPLSRgrid()
+
+        grid = GridSearchCV(MSclusPLSR, param_grid=param_grid, cv=X.shape[0], return_train_score=True, scoring="neg_mean_squared_error")
+        fit = grid.fit(X, Y)
+    finally:
+        rmtree(cachedir, ignore_errors=True)
     CVresults_max = pd.DataFrame(data=fit.cv_results_)
     return CVresults_max
 
@@ -0,0 +1,130 @@
+"""Loads the phenotypic image measurements and Incucyte exports into memory once."""
+import os
+import re
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from .pre_processing import CacheDir, HashInputs, SaveTable, LoadTable
+
+
+path = os.path.dirname(os.path.abspath(__file__))
+PhenotypePath = os.path.join(path, "data/Phenotypic_data")
+KEYS = ["Folder", "Extension", "Mutant", "Treatment", "Replicate", "Time"]
+# e.g. Results_M4ae3.csv, Results_C1_12.csv
+ResultsName = re.compile(r"Results_(?P<extension>.+?)(?:_(?P<time>\d+))?\.csv$")
+ExtensionName = re.compile(r"(?P<mutant>.+?)(?P<treatment>ut|ae|e)(?P<replicate>\d*)$")
+
+
+def ReadCSVs(files, n_jobs=8):
+    """Reads a list of csv files concurrently."""
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(pd.read_csv, files))
+
+
+def PhenotypeFiles():
+    """Relative paths of the ImageJ Results_*.csv files under Distances and of every other (Incucyte) export."""
+    files = sorted(os.path.relpath(f, PhenotypePath) for f in glob.glob(os.path.join(PhenotypePath, "**/*.csv"), recursive=True))
+    results = [f for f in files if f.startswith("Distances") and ResultsName.match(os.path.basename(f))]
+    return results, [f for f in files if f not in results]
+
+
+def ResultsKeys(fname):
+    """Folder, extension, mutant, treatment, replicate and time point of a Results csv as named by the imaging scripts.
+    Time courses are named Results_<extension>_<time>.csv, replicate images Results_<mutant><treatment><replicate>.csv."""
+    name = ResultsName.match(os.path.basename(fname))
+    extension, time = name.group("extension"), name.group("time")
+    parts = ExtensionName.match(extension) if time is None else None
+    return {
+        "Folder": os.path.basename(os.path.dirname(fname)),
+        "Extension": extension,
+        "Mutant": parts.group("mutant") if parts else "",
+        "Treatment": parts.group("treatment") if parts else "",
+        "Replicate": int(parts.group("replicate") or 1) if parts else 1,
+        "Time": np.nan if time is None else float(time),
+    }
+
+
+def MeasurementsFile():
+    """The Results csv files and the cache file of their measurements, keyed by the contents of the files."""
+    files, _ = PhenotypeFiles()
+    fullpaths = [os.path.join(PhenotypePath, f) for f in files]
+    return files, os.path.join(CacheDir(), "phenotypes_%s.npz" % HashInputs([__file__] + fullpaths, tuple(files)))
+
+
+@lru_cache(maxsize=None)
+def ImageMeasurements():
+    """All ImageJ measurements under data/Phenotypic_data/Distances as one table with a row per cell, keyed by
+    folder, extension (the file name between Results_ and the time point), mutant, treatment, replicate and time (NaN
+    if the file is not part of a time course). Measurements a file does not have are NaN. The table is saved in the
+    user's cache directory keyed by the contents of the files and read from there by later sessions, next to the
+    columns and dtypes of each file."""
+    files, fname = MeasurementsFile()
+    if os.path.exists(fname):
+        return LoadTable(fname)
+
+    fullpaths = [os.path.join(PhenotypePath, f) for f in files]
+    csvs = ReadCSVs(fullpaths)
+    columns = [np.array(X.columns, dtype=str) for X in csvs]
+    tmp = "%s_columns.%d.npz" % (fname[:-4], os.getpid())
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    dtypes = np.array([str(dtype) for X in csvs for dtype in X.dtypes], dtype=str)
+    np.savez(tmp, files=np.array(files, dtype=str), counts=np.array([c.size for c in columns]), names=np.concatenate(columns), dtypes=dtypes)
+    os.replace(tmp, fname[:-4] + "_columns.npz")
+
+    frames = []
+    for f, X in zip(files, csvs):
+        X = X.rename(columns={" ": "Cell"})
+        for ii, (key, value) in enumerate(ResultsKeys(f).items()):
+            X.insert(ii, key, value)
+        frames.append(X)
+    X = pd.concat(frames, ignore_index=True)
+    SaveTable(X, fname)
+    return X
+
+
+@lru_cache(maxsize=None)
+def ImageIndex():
+    """Row positions in ImageMeasurements of each (folder, extension, time) image."""
+    X = ImageMeasurements()
+    time = X["Time"].fillna(-1).values
+    groups = pd.Series(np.arange(X.shape[0])).groupby([X["Folder"].values, X["Extension"].values, time])
+    return {key: idx.values for key, idx in groups}
+
+
+@lru_cache(maxsize=None)
+def ImageColumns():
+    """Columns and their dtypes of each (folder, extension, time) image in the order of its Results csv."""
+    ImageMeasurements()
+    _, fname = MeasurementsFile()
+    with np.load(fname[:-4] + "_columns.npz") as data:
+        splits = np.cumsum(data["counts"])[:-1]
+        columns = zip(np.split(data["names"], splits), np.split(data["dtypes"], splits))
+        keys = [ResultsKeys(f) for f in data["files"]]
+    return {(k["Folder"], k["Extension"], -1 if np.isnan(k["Time"]) else k["Time"]): dict(zip(names, dtypes)) for k, (names, dtypes) in zip(keys, columns)}
+
+
+def ImageFile(folder, extension, time=None):
+    """Measurements of one image, as in the Results csv it was read from."""
+    key = (folder, extension, -1 if time is None else time)
+    X = ImageMeasurements().iloc[ImageIndex()[key], len(KEYS):].reset_index(drop=True)
+    dtypes = ImageColumns()[key]
+    return X.rename(columns={"Cell": " "})[list(dtypes)].astype(dtypes)
+
+
+def ImageTimes(folder, extension):
+    """Sorted time points of the images of a time course."""
+    return sorted(int(t) for (f, e, t) in ImageIndex() if f == folder and e == extension and t >= 0)
+
+
+@lru_cache(maxsize=None)
+def IncucyteExports():
+    """Every other csv under data/Phenotypic_data (Incucyte exports and annotations) by relative path, read concurrently."""
+    _, files = PhenotypeFiles()
+    return dict(zip(files, ReadCSVs([os.path.join(PhenotypePath, f) for f in files])))
+
+
+def IncucyteExport(fname):
+    """A copy of one export, given by its path relative to data/Phenotypic_data."""
+    return IncucyteExports()[fname].copy()
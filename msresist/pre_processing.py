@@ -1,39 +1,45 @@
 """ This scripts handles all the pre-processing required to merge and transform the raw mass spec biological replicates. """
 
 import os
+import hashlib
+from functools import lru_cache
 import numpy as np
 import pandas as pd
-from scipy import stats
-from collections import defaultdict
-from .motifs import FormatName, MapMotifs
+from . import motifs
+from .motifs import FormatName, MapMotifs, ProteomeFile, PublishStore, StoreIsCurrent
 
 
 path = os.path.dirname(os.path.abspath(__file__))
+CPTACfile = os.path.join(path, "data/MS/CPTAC/CPTAC-preprocessedMotfis")
 
 
 ###-------------------------- Pre-processing MS data --------------------------###
 def preprocessing(
-    AXLwt_GF=False, AXLm_ErlAF154=False, AXL_Das_DR=False, Vfilter=False, FCfilter=False, log2T=False, FCtoUT=False, rawdata=False, mc_row=True, mc_col=False, corrCut=0.5,
+    AXLwt_GF=False, AXLm_ErlAF154=False, AXL_Das_DR=False, Vfilter=False, FCfilter=False, log2T=False, FCtoUT=False, rawdata=False, mc_row=True, mc_col=False, corrCut=0.5, cache=True,
 ):
     """ Input: Raw MS bio-replicates. Output: Mean-centered merged data set.
     1. Concatenation, 2. log-2 transformation, 3. Mean-Center, 4. Merging, 5. Fold-change,
     6. Filters: 'Vfilter' filters by correlation when 2 overlapping peptides or std cutoff if >= 3.
     Note 1: 'motifs' redefines peptide sequences as XXXXXyXXXXX which affects merging.
     Note 2: Data is converted back to linear scale before filtering so 'log2T=True' to use log-scale for analysis.
-    Note 3: CPTAC is already normalized, so: mc_row and mc_col = False """
-    filesin = list()
+    Note 3: CPTAC is already normalized, so: mc_row and mc_col = False
+    Note 4: With 'cache' the output is saved in the user's cache directory (see CacheDir), keyed by the contents of
+    the input files (and of the code producing it) and the flags, and returned directly by later calls; changing an
+    input file changes the key. """
+    files = RawFiles(AXLwt_GF, AXLm_ErlAF154, AXL_Das_DR)
+
+    if cache:
+        flags = (AXLwt_GF, AXLm_ErlAF154, AXL_Das_DR, Vfilter, FCfilter, log2T, FCtoUT, rawdata, mc_row, mc_col, corrCut)
+        inputs = [__file__] + files if rawdata else [__file__, motifs.__file__, ProteomeFile] + files
+        fname = os.path.join(CacheDir(), "preprocessing_%s.npz" % HashInputs(inputs, flags))
+        if os.path.exists(fname):
+            return LoadTable(fname)
+        X = preprocessing(AXLwt_GF, AXLm_ErlAF154, AXL_Das_DR, Vfilter, FCfilter, log2T, FCtoUT, rawdata, mc_row, mc_col, corrCut, cache=False)
+        SaveTable(X, fname)
+        return X
 
-    if AXLwt_GF:
-        filesin.append(pd.read_csv(os.path.join(path, "./data/MS/GrowthFactors/20180817_JG_AM_TMT10plex_R1_psms_raw.csv")))
-        filesin.append(pd.read_csv(os.path.join(path, "./data/MS/GrowthFactors/20190214_JG_AM_PC9_AXL_TMT10_AC28_R2_PSMs_raw.csv")))
-        filesin.append(pd.read_csv(os.path.join(path, "./data/MS/GrowthFactors/CombinedBR3_TR1&2_raw.csv")))
-    if AXLm_ErlAF154:
-        filesin.append(pd.read_csv(os.path.join(path, "./data/MS/AXL/PC9_mutants_ActivatingAb_BR1_raw_wAcc.csv")))
-        filesin.append(pd.read_csv(os.path.join(path, "./data/MS/AXL/PC9_mutants_ActivatingAb_BR3_raw_wAcc.csv")))
-        filesin.append(pd.read_csv(os.path.join(path, "./data/MS/AXL/PC9_mutants_ActivatingAb_BR4_raw_wAcc.csv")))
-    if AXL_Das_DR:
-        filesin.append(pd.read_csv("msresist/data/Validations/Experimental/MassSpec/06232021-DasDR_BR1_Raw.csv").iloc[:, 1:])
-        filesin.append(pd.read_csv("msresist/data/Validations/Experimental/MassSpec/06232021-DasDR_BR2_Raw.csv").iloc[:, 1:])
+    filesin = [pd.read_csv(f) for f in files]
+    filesin = [f.iloc[:, 1:] if "DasDR" in fname else f for f, fname in zip(filesin, files)]
 
     data_headers = list(filesin[0].select_dtypes(include=["float64"]).columns)
     FCto = data_headers[0]
@@ -71,6 +77,146 @@ def preprocessing(
     return X
 
 
+def RawFiles(AXLwt_GF=False, AXLm_ErlAF154=False, AXL_Das_DR=False):
+    """ Raw MS bio-replicate files of each data set. """
+    files = []
+    if AXLwt_GF:
+        files.append(os.path.join(path, "./data/MS/GrowthFactors/20180817_JG_AM_TMT10plex_R1_psms_raw.csv"))
+        files.append(os.path.join(path, "./data/MS/GrowthFactors/20190214_JG_AM_PC9_AXL_TMT10_AC28_R2_PSMs_raw.csv"))
+        files.append(os.path.join(path, "./data/MS/GrowthFactors/CombinedBR3_TR1&2_raw.csv"))
+    if AXLm_ErlAF154:
+        files.append(os.path.join(path, "./data/MS/AXL/PC9_mutants_ActivatingAb_BR1_raw_wAcc.csv"))
+        files.append(os.path.join(path, "./data/MS/AXL/PC9_mutants_ActivatingAb_BR3_raw_wAcc.csv"))
+        files.append(os.path.join(path, "./data/MS/AXL/PC9_mutants_ActivatingAb_BR4_raw_wAcc.csv"))
+    if AXL_Das_DR:
+        files.append(os.path.join(path, "./data/Validations/Experimental/MassSpec/06232021-DasDR_BR1_Raw.csv"))
+        files.append(os.path.join(path, "./data/Validations/Experimental/MassSpec/06232021-DasDR_BR2_Raw.csv"))
+    return files
+
+
+def HashInputs(files, flags):
+    """ SHA-1 of the contents of the files and the flags. """
+    digest = hashlib.sha1(repr(flags).encode())
+    for fname in files:
+        with open(fname, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def CacheDir():
+    """ Directory of the cached tables: $MSRESIST_CACHE, or msresist under the user's cache directory. """
+    return os.environ.get("MSRESIST_CACHE") or os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "msresist")
+
+
+def SaveTable(X, fname):
+    """ Save a table column by column, without pickling: the float64 columns as one block and every other column
+    as its own array (see EncodeValues), along with the dtype of each column. Columns must be a flat list of
+    strings. """
+    if isinstance(X.columns, pd.MultiIndex) or not all(isinstance(c, str) for c in X.columns):
+        raise ValueError("SaveTable only saves tables with a flat header of string column names.")
+
+    floats = [ii for ii, dtype in enumerate(X.dtypes) if dtype == np.float64]
+    arrays = {"columns": np.array(X.columns, dtype=str), "dtypes": np.array([str(dtype) for dtype in X.dtypes], dtype=str), "floats": np.array(floats, dtype=np.intp)}
+    arrays["block"] = X.iloc[:, floats].values if floats else np.empty((X.shape[0], 0))
+    EncodeValues(X.index, "index", arrays)
+    for ii in range(X.shape[1]):
+        if ii not in floats:
+            EncodeValues(X.iloc[:, ii], "col%d" % ii, arrays)
+
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    tmp = "%s.%d.npz" % (fname[:-4], os.getpid())
+    np.savez(tmp, **arrays)
+    os.replace(tmp, fname)
+
+
+def LoadTable(fname):
+    """ Load a table saved with SaveTable. """
+    with np.load(fname, allow_pickle=False) as data:
+        columns = list(data["columns"])
+        floats = list(data["floats"])
+        block = data["block"]
+        cols = {}
+        for ii, dtype in enumerate(data["dtypes"]):
+            values = block[:, floats.index(ii)] if ii in floats else DecodeValues(data, "col%d" % ii)
+            cols[ii] = pd.Series(values).astype(dtype)
+        X = pd.DataFrame(cols)
+        X.index = pd.Index(DecodeValues(data, "index"))
+    X.columns = columns
+    return X
+
+
+TYPECODES = {"s": str, "b": lambda v: v == "True", "i": int, "f": float, "n": lambda v: None}
+
+
+def EncodeValues(values, key, arrays):
+    """ Add a column or index to the arrays to save under key. Numeric values are saved as they are and strings as
+    fixed-width unicode. Columns mixing types are saved as the string of each value, under key, plus a code of its
+    type (see TYPECODES), under key_types. """
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufmM":
+        arrays[key] = np.asarray(values)
+    elif all(isinstance(v, str) for v in values):
+        arrays[key] = np.array(list(values), dtype=str)
+    else:
+        codes = [TypeCode(v) for v in values]
+        arrays[key] = np.array([repr(float(v)) if c == "f" else str(v) for v, c in zip(values, codes)], dtype=str)
+        arrays[key + "_types"] = np.array(codes, dtype="U1")
+
+
+def DecodeValues(data, key):
+    """ A column or index saved by EncodeValues. """
+    if key + "_types" not in data:
+        return data[key]
+    return np.array([TYPECODES[c](v) for v, c in zip(data[key], data[key + "_types"])], dtype=object)
+
+
+def TypeCode(value):
+    """ Code of the type of a value in TYPECODES. Booleans are checked before integers, which they subclass. """
+    for code, types in (("n", type(None)), ("s", str), ("b", (bool, np.bool_)), ("i", (int, np.integer)), ("f", (float, np.floating))):
+        if isinstance(value, types):
+            return code
+    raise ValueError("SaveTable cannot save values of type %s." % type(value).__name__)
+
+
+@lru_cache(maxsize=None)
+def CPTACstore():
+    """ The preprocessed CPTAC phosphoproteome as a float32 (peptides x samples) value matrix with missing values as
+    0 and a boolean mask of observed values, both memory-mapped, plus the annotation table, the sample names and the
+    original column order. It is converted from the csv on first use and rebuilt if the csv is newer. """
+    csv, store = CPTACfile + ".csv", CPTACfile + ".store"
+
+    if not StoreIsCurrent(store, csv):
+        X = pd.read_csv(csv).iloc[:, 1:]
+        d = X.select_dtypes(include=["float64"])
+
+        tmp = "%s.%d" % (store, os.getpid())
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "values.npy"), np.nan_to_num(d.values).astype(np.float32))
+        np.save(os.path.join(tmp, "observed.npy"), ~np.isnan(d.values))
+        np.save(os.path.join(tmp, "samples.npy"), np.array(d.columns, dtype=str))
+        np.save(os.path.join(tmp, "columns.npy"), np.array(X.columns, dtype=str))
+        SaveTable(X.drop(d.columns, axis=1), os.path.join(tmp, "annotations.npz"))
+        PublishStore(tmp, store, csv)
+
+    return {
+        "values": np.load(os.path.join(store, "values.npy"), mmap_mode="r"),
+        "observed": np.load(os.path.join(store, "observed.npy"), mmap_mode="r"),
+        "samples": list(np.load(os.path.join(store, "samples.npy"))),
+        "columns": list(np.load(os.path.join(store, "columns.npy"))),
+        "annotations": LoadTable(os.path.join(store, "annotations.npz")),
+    }
+
+
+def CPTACmotifs():
+    """ Drop-in for reading CPTAC-preprocessedMotfis.csv without its index column: the annotations and the sample
+    values (float64, missing values as NaN) in the csv's column order, built from CPTACstore. """
+    store = CPTACstore()
+    d = np.where(store["observed"], store["values"].astype(np.float64), np.nan)
+    X = pd.concat([store["annotations"].reset_index(drop=True), pd.DataFrame(d, columns=store["samples"])], axis=1)
+    return X[store["columns"]]
+
+
 def preprocessCPTAC():
     """ Replace patient identifiers, fill NaNs, and make it compatible with current code. """
     X = pd.read_csv(os.path.join(path, "./data/MS/CPTAC/CPTAC3_Lung_Adeno_Carcinoma_Phosphoproteome.phosphopeptide.tmt10.csv"))
@@ -91,24 +237,34 @@ def filter_NaNpeptides(X, cut=False, tmt=False):
     if cut:
         Xidx = np.count_nonzero(~np.isnan(d), axis=1) / d.shape[1] >= cut
     else:
-        idx_values = FindIdxValues(X)
-        dict_ = defaultdict(list)
-        for i in range(idx_values.shape[0]):
-            dict_[idx_values[i, 0]].append(idx_values[i, -1])
-        Xidx = [len(set(dict_[i])) >= tmt for i in range(X.shape[0])]
+        Xidx = CountTMTexperiments(d) >= tmt
     return X.iloc[Xidx, :]
 
 
+def SampleToExperiment(samples):
+    """ TMT experiment of each CPTAC sample as an integer vector. """
+    StoE = pd.read_csv(os.path.join(path, "./data/MS/CPTAC/IDtoExperiment.csv"))
+    assert all(StoE.iloc[:, 0] == samples), "Sample labels don't match."
+    return StoE.iloc[:, 1].values
+
+
+def CountTMTexperiments(d):
+    """ Number of TMT experiments in which each peptide has at least one observed value. The samples are sorted
+    by experiment and the observed-value mask is summed within each experiment's block of columns. """
+    experiments = SampleToExperiment(d.columns)
+    order = np.argsort(experiments, kind="stable")
+    blocks = np.flatnonzero(np.r_[True, experiments[order][1:] != experiments[order][:-1]])
+    observed = ~np.isnan(d.values[:, order])
+    return np.count_nonzero(np.add.reduceat(observed, blocks, axis=1), axis=1)
+
+
 def FindIdxValues(X):
     """Find the patient indices corresponding to all non-missing values grouped in TMT experiments."""
     data = X.select_dtypes(include=["float64"])
     idx = np.argwhere(~np.isnan(data.values))
     idx[:, 1] += 4  # add ID variable columns
-    StoE = pd.read_csv("msresist/data/MS/CPTAC/IDtoExperiment.csv")
-    assert all(StoE.iloc[:, 0] == data.columns), "Sample labels don't match."
-    StoE = StoE.iloc[:, 1].values
-    tmt = [[StoE[idx[ii][1] - 4]] for ii in range(idx.shape[0])]
-    return np.append(idx, tmt, axis=1)
+    StoE = SampleToExperiment(data.columns)
+    return np.append(idx, StoE[idx[:, 1] - 4, np.newaxis], axis=1)
 
 
 def MergeDfbyMean(X, values, indices):
@@ -221,47 +377,41 @@ def MapOverlappingPeptides(ABC):
 
 def BuildMatrix(peptides, ABC, data_headers):
     """ Map identified recurrent peptides to generate complete matrices with values.
-    If recurrent peptides = 2, the correlation coefficient is included in a new column. """
-    ABC = ABC.reset_index().set_index(["Sequence", "Protein"], drop=False)
-    ABC = ABC.sort_index()
-
-    corrcoefs, peptideslist, bioReps = [], [], []
-    for idx, seq in enumerate(peptides.iloc[:, 1]):
-        name = peptides.iloc[idx, 0]
-
-        # Skip blank
-        if name == "(blank)":
-            continue
-
-        pepts = ABC.loc[seq, name]
-        pepts = pepts.iloc[:, 1:]
-        names = pepts.iloc[:, 0]
-
-        if len(pepts) == 1:
-            peptideslist.append(pepts.iloc[0, :])
-        elif len(pepts) == 2 and len(set(names)) == 1:
-            fc = Linear(pepts[data_headers].copy(), data_headers)
-            corrcoef, _ = stats.pearsonr(fc.iloc[0, :], fc.iloc[1, :])
-            for i in range(len(pepts)):
-                corrcoefs.append(np.round(corrcoef, decimals=2))
-                peptideslist.append(pepts.iloc[i, :])
-        elif len(pepts) >= 3 and len(set(names)) == 1:
-            for i in range(len(pepts)):
-                peptideslist.append(pepts.iloc[i, :])
-                bioReps.append(len(pepts))
-        else:
-            print("check this", pepts)
-
-    if corrcoefs:
-        matrix = pd.DataFrame(peptideslist).reset_index(drop=True).assign(r2_Std=corrcoefs)
+    If recurrent peptides = 2, the correlation coefficient is included in a new column; if >= 3, the number of
+    biological replicates. The rows of all peptides are gathered at once, grouped in the order of peptides. Peptides
+    are matched by protein and sequence, and all must recur the same way (1, 2 or >= 3 times). """
+    peptides = peptides[peptides.iloc[:, 0] != "(blank)"]
+    keys = pd.MultiIndex.from_arrays([peptides.iloc[:, 0], peptides.iloc[:, 1]])
+    group = keys.get_indexer(pd.MultiIndex.from_arrays([ABC["Protein"], ABC["Sequence"]]))
+    rows = np.flatnonzero(group >= 0)
+    rows = rows[np.argsort(group[rows], kind="stable")]
+    reps = np.bincount(group[rows], minlength=len(keys))[group[rows]]
+
+    recurrence = np.unique(np.minimum(reps, 3))
+    if recurrence.size > 1:
+        raise ValueError("BuildMatrix expects peptides that all recur once, twice or at least 3 times, got %s." % sorted(set(reps.tolist())))
+
+    matrix = ABC.iloc[rows, :].reset_index(drop=True)
+
+    if list(recurrence) == [2]:
+        fc = np.power(2, matrix[data_headers].values)
+        corrcoefs = np.round(RowPearson(fc[0::2], fc[1::2]), decimals=2)
+        matrix = matrix.assign(r2_Std=np.repeat(corrcoefs, 2))
+
+    elif list(recurrence) == [3]:
+        matrix = matrix.assign(BioReps=reps)
 
-    elif bioReps:
-        matrix = pd.DataFrame(peptideslist).reset_index(drop=True).assign(BioReps=bioReps)
+    return matrix
 
-    else:
-        matrix = pd.DataFrame(peptideslist).reset_index(drop=True)
 
-    return matrix
+def RowPearson(X, Y):
+    """ Pearson correlation coefficient between each pair of rows of X and Y, as stats.pearsonr. NaN if any value
+    is missing or a row is constant. """
+    xm = X - np.mean(X, axis=1, keepdims=True)
+    ym = Y - np.mean(Y, axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = np.sum((xm / np.linalg.norm(xm, axis=1, keepdims=True)) * (ym / np.linalg.norm(ym, axis=1, keepdims=True)), axis=1)
+    return np.clip(r, -1.0, 1.0)
 
 
 def CorrCoefFilter(X, corrCut=0.6):
@@ -273,11 +423,9 @@ def CorrCoefFilter(X, corrCut=0.6):
 def TripsMeanAndStd(triplicates, merging_indices, data_headers):
     """ Merge all triplicates by mean and standard deviation across conditions. Note this builds a multilevel header
     meaning we have 2 values for each condition (eg within Erlotinib -> Mean | Std). """
-    func_tri = {}
-    for i in triplicates[data_headers].columns:
-        func_tri[i] = np.mean, np.std
-    X = pd.pivot_table(triplicates, values=triplicates[data_headers].columns, index=merging_indices, aggfunc=func_tri)
-    return X.reset_index()
+    grouped = triplicates.groupby(merging_indices)[list(data_headers)]
+    X = pd.concat([grouped.mean(), grouped.std()], axis=1, keys=["mean", "std"]).swaplevel(axis=1).sort_index(axis=1)
+    return X.dropna(how="all").reset_index()
 
 
 def FilterByRange(X, rangeCut=0.4):
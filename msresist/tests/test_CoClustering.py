@@ -5,9 +5,13 @@ Testing file for the clustering methods by data and sequence.
 import pickle
 import pytest
 import numpy as np
-from ..clustering import MassSpecClustering
-from ..expectation_maximization import EM_clustering
+import pandas as pd
+from sklearn.base import clone
+from ..clustering import MassSpecClustering, align_clusters, PSPLlibrary, PSPLdict, KinaseDistanceNull, PermutePositions
+from ..expectation_maximization import EM_clustering, EM_clustering_numpy, mixture_from_gmm
 from ..pre_processing import preprocessing
+from ..pam250 import PAM250, EncodePam250, distanceCalc
+from ..binomial import AAlist
 
 
 X = preprocessing(AXLwt_GF=True, Vfilter=True, FCfilter=True, log2T=True, mc_row=True)
@@ -27,6 +31,15 @@ def test_wins(distance_method):
     assert distances[0] < distances[1]
 
 
+def test_align_clusters():
+    """ Test that cluster alignment recovers a shuffled labeling. """
+    scores = np.random.dirichlet(np.ones(24), size=200)
+    perm = np.random.permutation(24)
+    shuffled = scores[:, perm]
+
+    np.testing.assert_array_equal(shuffled[:, align_clusters(scores, shuffled)], scores)
+
+
 @pytest.mark.parametrize("w", [0, 0.1, 1.0, 10.0])
 @pytest.mark.parametrize("ncl", [2, 5])
 @pytest.mark.parametrize("distance_method", ["PAM250", "Binomial", "PAM250_fixed"])
@@ -51,3 +64,157 @@ def test_pickle(distm):
 
     assert np.all(np.isfinite(unpickled.scores_))
     np.testing.assert_allclose(MSC.scores_, scores, rtol=0.5, atol=0.5)
+
+
+@pytest.mark.parametrize("distm", ["PAM250", "Binomial", "PAM250_fixed"])
+def test_numpy_engine(distm):
+    """ Test that an EM step of the numpy engine matches pomegranate from the same, not yet converged, start. """
+    MSC = MassSpecClustering(info, 3, SeqWeight=2, distance_method=distm, pre_motifs=preMotifSet[0:3])
+    np.random.seed(0)
+    _, _, _, gmm = EM_clustering(data, info, 3, MSC.dist, max_iterations=2)
+    start = mixture_from_gmm(gmm)
+
+    avgScore, scores, _, gmm = EM_clustering(data, info, 3, gmmIn=gmm, max_iterations=1)
+    avgScoreN, scoresN, _, gmmN = EM_clustering_numpy(data, info, 3, MSC.dist, gmmIn=start, max_iterations=1)
+
+    np.testing.assert_allclose(scoresN, scores, atol=1e-6)
+    np.testing.assert_allclose(gmmN.means, mixture_from_gmm(gmm).means, atol=1e-6)
+    np.testing.assert_allclose(avgScoreN, avgScore, rtol=1e-6)
+
+
+@pytest.mark.parametrize("distm", ["PAM250", "Binomial", "PAM250_fixed"])
+def test_numpy_engine_loglik(distm):
+    """ Test that the numpy engine never decreases the log-likelihood. The PAM250 and Binomial sequence terms are
+    similarity averages rather than likelihoods, so EM only guarantees this with SeqWeight=0 or fixed motifs. """
+    SeqWeight = 2 if distm == "PAM250_fixed" else 0
+    MSC = MassSpecClustering(info, 3, SeqWeight=SeqWeight, distance_method=distm, pre_motifs=preMotifSet[0:3])
+    np.random.seed(0)
+    avgScore, _, _, gmm = EM_clustering_numpy(data, info, 3, MSC.dist, max_iterations=0)
+
+    for _ in range(20):
+        lastScore = avgScore
+        avgScore, _, _, gmm = EM_clustering_numpy(data, info, 3, MSC.dist, gmmIn=gmm, max_iterations=1)
+        assert avgScore >= lastScore - 1e-8
+
+
+@pytest.mark.parametrize("distm", ["PAM250", "Binomial"])
+def test_parallel_restarts(distm):
+    """ Test that restarts spread over a process pool return a valid fit. """
+    MSC = MassSpecClustering(info, 3, SeqWeight=2, distance_method=distm, engine="numpy", n_jobs=2).fit(X=data, nRepeats=3)
+
+    assert np.all(np.isfinite(MSC.scores_))
+    np.testing.assert_allclose(np.sum(MSC.scores_, axis=1), 1.0)
+
+
+def test_pam250_factorized():
+    """ Test that the factorized PAM250 update matches the dense pairwise matrix. The int8 matrix of
+    MotifPam250Scores can overflow, so the reference is accumulated in int32. """
+    seqs = [s.upper() for s in info["Sequence"]]
+    encoded, pam250m = EncodePam250(seqs)
+    scores = distanceCalc(np.zeros((len(seqs), len(seqs)), dtype=np.int32), encoded, pam250m)
+    scores = np.tril(scores) + np.tril(scores, k=-1).T
+    dense = PAM250(seqs, 2.0, background=scores)
+    factorized = PAM250(seqs, 2.0)
+    np.testing.assert_allclose(dense.logWeights, factorized.logWeights)
+
+    weights = np.random.rand(len(seqs))
+    for dist in (dense, factorized):
+        dist.weightsIn[:] = weights
+        dist.from_summaries()
+    np.testing.assert_allclose(dense.logWeights, factorized.logWeights)
+
+
+@pytest.mark.parametrize("distm", ["PAM250", "Binomial"])
+def test_batch_logWeights(distm):
+    """ Test that the all-clusters sequence update matches updating each cluster separately. """
+    dist = MassSpecClustering(info, 3, SeqWeight=2, distance_method=distm).dist
+    weights = np.random.dirichlet(np.ones(3), size=info.shape[0])
+    batch = dist.batch_logWeights(weights)
+
+    for ii in range(3):
+        dd = dist.copy()
+        dd.weightsIn[:] = weights[:, ii]
+        dd.from_summaries()
+        np.testing.assert_allclose(batch[:, ii], dd.logWeights)
+
+
+@pytest.mark.parametrize("distm", ["PAM250", "Binomial", "PAM250_fixed"])
+def test_save_load(distm, tmp_path):
+    """ Test that a model saved to npz loads back with the same fit and annotations, dtypes included. """
+    annotated = info.assign(Index=np.arange(info.shape[0]))
+    annotated.iloc[0, annotated.columns.get_loc("Gene")] = np.nan
+    MSC = MassSpecClustering(annotated, 3, SeqWeight=2, distance_method=distm, pre_motifs=preMotifSet[0:2]).fit(X=data)
+    MSC.save(tmp_path / "model.npz")
+    loaded = MassSpecClustering.load(tmp_path / "model.npz")
+
+    np.testing.assert_allclose(MSC.scores_, loaded.scores_)
+    np.testing.assert_allclose(MSC.transform(), loaded.transform())
+    np.testing.assert_array_equal(MSC.labels(), loaded.labels())
+    pd.testing.assert_frame_equal(loaded.info, MSC.info)
+
+    # Changing SeqWeight keeps the stored background instead of recomputing it
+    if distm != "PAM250_fixed":
+        background = loaded.dist.background
+        assert loaded.set_params(SeqWeight=3).dist.background is background
+
+
+@pytest.mark.parametrize("distm", ["PAM250", "Binomial", "PAM250_fixed"])
+def test_predict_new(distm):
+    """ Test that scoring the training peptides as new data recovers the fitted assignments. """
+    MSC = MassSpecClustering(info, 3, SeqWeight=2, distance_method=distm, pre_motifs=preMotifSet[0:2]).fit(X=data)
+    proba = MSC.predict_proba(data, info, chunksize=50)
+
+    np.testing.assert_allclose(np.sum(proba, axis=1), 1.0)
+    np.testing.assert_allclose(proba, MSC.scores_, atol=0.1)
+    assert np.mean(MSC.predict(data, info) == MSC.predict()) > 0.95
+
+    # A sample with no observed values falls back to the average fitted centers
+    missing = data.values.copy()
+    missing[0] = np.nan
+    np.testing.assert_allclose(MSC.transform(missing)[0], np.mean(MSC.transform(), axis=0))
+
+
+@pytest.mark.parametrize("distance_method", ["PAM250", "Binomial"])
+def test_clone_background(distance_method):
+    """ Test that sklearn clones share the sequence background and pick up a new SeqWeight. """
+    MSC = MassSpecClustering(info, 2, SeqWeight=0, distance_method=distance_method)
+    cloned = clone(MSC).set_params(SeqWeight=5)
+    reference = MassSpecClustering(info, 2, SeqWeight=5, distance_method=distance_method)
+
+    assert cloned.dist.background[1] is MSC.dist.background[1]
+    np.testing.assert_allclose(cloned.dist.logWeights, reference.dist.logWeights)
+
+
+def test_pssms():
+    """ Test that cluster PSSMs are computed together and match their DataFrame view. """
+    MSC = MassSpecClustering(info, 3, SeqWeight=0, distance_method="PAM250").fit(X=data)
+    pssms = MSC.pssms()
+    frames = MSC.pssm_frames()
+
+    assert pssms.shape == (3, 20, 11)
+    assert np.all((pssms >= 0) & (pssms <= 3))
+    np.testing.assert_array_equal(np.array([np.array(frame) for frame in frames]), pssms)
+    assert list(frames[0].index) == AAlist
+
+
+def test_kinase_library():
+    """ Test that the packed kinase library holds every specificity profile. """
+    library = PSPLlibrary()
+    PSPLs = PSPLdict()
+
+    assert library.profiles.shape == (len(PSPLs), 20, 9)
+    for kinase, profile in PSPLs.items():
+        np.testing.assert_array_equal(library[kinase], profile)
+    assert library.phosphoacceptors[library.index["ERK2"]] == "S/T"
+
+
+def test_kinase_null():
+    """ Test that the permutation null matches distances to explicitly permuted PSSMs. """
+    profiles = PSPLlibrary().profiles
+    pssms = np.random.rand(4, 20, 9) * 3
+    null = KinaseDistanceNull(profiles, pssms, nPermutations=300, seed=5, blocksize=300)
+
+    permuted = PermutePositions(pssms, 300, np.random.SeedSequence(5).spawn(1)[0])
+    expected = np.linalg.norm(profiles[:, np.newaxis, np.newaxis] - permuted[np.newaxis], axis=(3, 4))
+    np.testing.assert_allclose(null, expected)
+    np.testing.assert_array_equal(null, KinaseDistanceNull(profiles, pssms, nPermutations=300, seed=5, blocksize=300, n_jobs=2))
@@ -4,13 +4,12 @@ Testing file for minimum variance across clusters using CPTAC data.
 
 import pytest
 import numpy as np
-import pandas as pd
 from scipy.spatial.distance import cdist
 from collections import Counter
 from ..clustering import MassSpecClustering
-from ..pre_processing import filter_NaNpeptides
+from ..pre_processing import filter_NaNpeptides, CPTACmotifs
 
-X = pd.read_csv("msresist/data/MS/CPTAC/CPTAC-preprocessedMotfis.csv").iloc[:, 1:]
+X = CPTACmotifs()
 X = filter_NaNpeptides(X, tmt=25)
 d = X.select_dtypes(include=['float64']).T
 i = X.select_dtypes(include=['object'])
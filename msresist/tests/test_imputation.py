@@ -0,0 +1,42 @@
+"""
+Testing file for the checkpointed imputation benchmark.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from ..imputation import ImputationBenchmark, CellFile, LoadRun
+from ..pre_processing import path
+
+
+def SyntheticCPTAC(n=30, seed=0):
+    """ A table laid out as CPTACmotifs: four annotation columns and the CPTAC samples, with a few missing values. """
+    samples = pd.read_csv(os.path.join(path, "data/MS/CPTAC/IDtoExperiment.csv")).iloc[:, 0]
+    rng = np.random.default_rng(seed)
+    AA = list("ACDEFGHIKLMNPQRSTVWY")
+    seqs = ["".join(rng.choice(AA, 5)) + rng.choice(list("sty")) + "".join(rng.choice(AA, 5)) for _ in range(n)]
+    info = pd.DataFrame({"Protein": ["P%d" % ii for ii in range(n)], "Sequence": seqs, "Gene": ["G%d" % ii for ii in range(n)], "Position": ["S%d" % ii for ii in range(n)]}, dtype=object)
+    d = rng.normal(size=(n, samples.size))
+    d[rng.random(d.shape) < 0.05] = np.nan
+    return pd.concat([info, pd.DataFrame(d, columns=samples)], axis=1)
+
+
+def test_imputation_checkpoint(tmp_path):
+    """ Test that a rerun after losing one cell only refits that cell and returns the same results, and that the
+    missing values of each run include those of the previous run. """
+    grid = {"ncl": [2, 3], "SeqWeight": [0.5], "distance_method": ["PAM250"]}
+    kwargs = dict(n_runs=2, tmt=7, checkpoint=str(tmp_path), n_jobs=2, engine="numpy", X=SyntheticCPTAC())
+    results = ImputationBenchmark(grid, **kwargs)
+
+    assert results.shape[0] == 2 * 2 * 30
+    masks = [np.isnan(LoadRun(os.path.join(str(tmp_path), "run%d.npz" % ii))[0].select_dtypes(include=["float64"]).values) for ii in range(2)]
+    assert np.all(masks[1][masks[0]]) and np.sum(masks[1]) > np.sum(masks[0])
+
+    lost = CellFile(str(tmp_path), 1, (3, 0.5, "PAM250"))
+    kept = [f for f in os.listdir(str(tmp_path)) if f.startswith("run") and f != os.path.basename(lost)]
+    mtimes = {f: os.stat(os.path.join(str(tmp_path), f)).st_mtime_ns for f in kept}
+    os.remove(lost)
+
+    pd.testing.assert_frame_equal(ImputationBenchmark(grid, **kwargs), results)
+    assert os.path.exists(lost)
+    assert mtimes == {f: os.stat(os.path.join(str(tmp_path), f)).st_mtime_ns for f in kept}
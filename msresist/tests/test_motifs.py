@@ -0,0 +1,56 @@
+"""
+Testing file for the k-mer index of the proteome.
+"""
+
+import io
+from ..motifs import DictProteomeNameToSeq, ProteomeIndex, MatchProtNames
+
+
+FASTA = """>sp|P1|A_HUMAN Protein A OS=Homo sapiens GN=GENEA PE=1
+MKTAYIAKQRQISFVKSHFSRQ
+>sp|P2|B_HUMAN Protein B OS=Homo sapiens GN=GENEB PE=1
+MSTNPKPQRKTKRNTNRRPQDVKFPGG
+>sp|P3|C_HUMAN Protein C OS=Homo sapiens GN=GENEC PE=1
+QISFVKSHFSRQMKTAYIAKQRQISFVKSHF
+>sp|P4|D_HUMAN Protein D OS=Homo sapiens GN=GENED PE=1
+KR
+"""
+
+
+def LinearFind(ProteomeDict, peptide):
+    """ Every offset of a peptide in the proteome concatenated as in ProteomeIndex, by str.find. """
+    proteome = "".join(seq + "\n" for seq in ProteomeDict.values())
+    hits, pos = [], proteome.find(peptide)
+    while pos >= 0:
+        hits.append(pos)
+        pos = proteome.find(peptide, pos + 1)
+    return hits
+
+
+def LinearLocate(ProteomeDict, name, peptide):
+    """ The protein and offset that the linear scan of MatchProtNames used to assign to a peptide. """
+    if name in ProteomeDict and peptide in ProteomeDict[name]:
+        return name, ProteomeDict[name].find(peptide)
+    for key, seq in ProteomeDict.items():
+        if peptide in seq:
+            return key, seq.find(peptide)
+    return None, -1
+
+
+def test_proteome_index():
+    """ Test that the k-mer index finds the same peptides as str.find, including several hits, missing residues,
+    peptides shorter than k and peptides that would only span two proteins. """
+    ProteomeDict = DictProteomeNameToSeq(io.StringIO(FASTA), "gene")
+    index = ProteomeIndex.fromDict(ProteomeDict)
+    peptides = ["QISFVKSHF", "MKTAYIAKQR", "KSHFSRQ", "KR", "Q", "MKTAYIAKQW", "ZZZZZZZ", "SRQMST", "PGG", "QRQISFVKSHFSRQ"]
+
+    for pep, hits in zip(peptides, index.find(peptides)):
+        assert list(hits) == LinearFind(ProteomeDict, pep), pep
+
+    names = ["GENEB", "GENEC", "GENEA", "GENED", "GENEX", "GENEA", "GENEA", "GENEA", "GENEB", "GENEC"]
+    proteins, offsets = index.locate(names, [pep.lower() for pep in peptides])
+    assert list(zip(proteins, offsets)) == [LinearLocate(ProteomeDict, name, pep) for name, pep in zip(names, peptides)]
+
+    found = [ii for ii, protein in enumerate(proteins) if protein is not None]
+    matched = MatchProtNames(ProteomeDict, [names[ii] for ii in found], [peptides[ii] for ii in found], index)
+    assert matched == ([proteins[ii] for ii in found], [peptides[ii] for ii in found], list(range(len(found))), [offsets[ii] for ii in found])
@@ -0,0 +1,21 @@
+"""
+Testing file for the phenotype measurement store.
+"""
+
+import os
+import pandas as pd
+from ..phenotypes import PhenotypePath, ImageFile, ImageTimes, IncucyteExport
+
+
+def test_image_store():
+    """ Test that images and exports from the store match the csv files they were read from. """
+    fname = os.path.join(PhenotypePath, "Distances/48hrs/Results_M4ae3.csv")
+    pd.testing.assert_frame_equal(ImageFile("48hrs", "M4ae3"), pd.read_csv(fname))
+
+    times = ImageTimes("PC9_TimeCourse", "C1")
+    assert times == sorted(times) and len(times) == 20
+    fname = os.path.join(PhenotypePath, "Distances/PC9_TimeCourse/Results_C1_%d.csv" % times[1])
+    pd.testing.assert_frame_equal(ImageFile("PC9_TimeCourse", "C1", times[1]), pd.read_csv(fname))
+
+    fname = "AXLmutants/CellViability/Phase/BR1_Phase.csv"
+    pd.testing.assert_frame_equal(IncucyteExport(fname), pd.read_csv(os.path.join(PhenotypePath, fname)))
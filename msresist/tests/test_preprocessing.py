@@ -0,0 +1,97 @@
+"""
+Testing file for the pre-processing cache.
+"""
+
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from scipy import stats
+from ..pre_processing import preprocessing, SaveTable, LoadTable, VFilter, MapOverlappingPeptides, BuildMatrix, RowPearson
+
+
+def test_preprocessing_cache(tmp_path, monkeypatch):
+    """ Test that a cached pre-processing call returns the same table as recomputing it. """
+    monkeypatch.setenv("MSRESIST_CACHE", str(tmp_path))
+    flags = dict(AXLwt_GF=True, Vfilter=True, FCfilter=True, log2T=True, mc_row=True)
+    X = preprocessing(cache=False, **flags)
+
+    pd.testing.assert_frame_equal(preprocessing(**flags), X)
+    pd.testing.assert_frame_equal(preprocessing(**flags), X)
+    assert len(os.listdir(str(tmp_path))) == 1
+
+
+def test_table_roundtrip(tmp_path):
+    """ Test that tables with mixed column types are saved without pickling and loaded unchanged, and that
+    multilevel headers are rejected. """
+    X = pd.DataFrame({"Sequence": ["AAAAAyAAAAA", "CCCCCsCCCCC"], "PC9": [0.5, np.nan], "r2_Std": ["N/A", 0.75], "BioReps": [1, 3]}, index=[4, 4])
+    X["Gene"] = pd.Series(["AXL", np.nan], index=X.index, dtype=object)
+    X["Mixed"] = pd.Series([None, True], index=X.index, dtype=object)
+    SaveTable(X, str(tmp_path / "table.npz"))
+
+    pd.testing.assert_frame_equal(LoadTable(str(tmp_path / "table.npz")), X)
+    with np.load(str(tmp_path / "table.npz"), allow_pickle=False) as data:
+        assert all(data[key].dtype != object for key in data.files)
+
+    with pytest.raises(ValueError):
+        SaveTable(pd.DataFrame(np.zeros((2, 2)), columns=pd.MultiIndex.from_tuples([("PC9", "mean"), ("PC9", "std")])), str(tmp_path / "multi.npz"))
+
+
+def ReplicatesTable():
+    """ Peptides measured once, twice (reproducible, anti-correlated, or with a missing value) and 3 or 4 times
+    (with a low or a high standard deviation), in log2 scale. """
+    values = {
+        "P1": [[0.1, 0.2, 0.3, 0.4]],
+        "P2": [[0.1, 0.5, 0.9, 1.3], [0.2, 0.6, 1.0, 1.2]],
+        "P3": [[0.1, 0.5, 0.9, 1.3], [1.3, 0.9, 0.5, 0.1]],
+        "P4": [[0.1, np.nan, 0.9, 1.3], [0.2, 0.6, 1.0, 1.2]],
+        "P5": [[0.1, 0.2, 0.3, 0.4], [0.2, 0.3, 0.4, 0.5], [0.3, 0.1, 0.5, 0.3]],
+        "P6": [[0.1, 2.0, -1.0, 0.4], [1.5, -0.5, 0.4, 2.5], [-1.0, 0.3, 1.8, -0.2]],
+        "P7": [[0.0, 0.1, 0.2, 0.3], [0.1, 0.2, 0.3, 0.4], [0.2, 0.3, 0.4, 0.5], [0.3, 0.4, 0.5, 0.6]],
+    }
+    names = [name for name, rows in values.items() for _ in rows]
+    X = pd.DataFrame(np.concatenate(list(values.values())), columns=["A", "B", "C", "D"])
+    X.insert(0, "Protein", pd.Series(names, dtype=object))
+    X.insert(1, "Sequence", pd.Series([name[-1] * 5 + "y" + name[-1] * 5 for name in names], dtype=object))
+    X.insert(2, "Gene", pd.Series([name.replace("P", "G") for name in names], dtype=object))
+    X.insert(3, "Position", pd.Series(["Y1"] * len(names), dtype=object))
+    return X
+
+
+def test_vfilter():
+    """ Test the replicate filter against the output of the previous peptide-by-peptide implementation. """
+    X = VFilter(ReplicatesTable(), ["Protein", "Sequence", "Gene", "Position"], ["A", "B", "C", "D"], corrCut=0.55, stdCut=0.5)
+
+    expected = pd.DataFrame({
+        "Protein": ["P1", "P2", "P5", "P7"],
+        "Sequence": ["11111y11111", "22222y22222", "55555y55555", "77777y77777"],
+        "A": [0.1, 0.15, 0.2, 0.15],
+        "B": [0.2, 0.55, 0.2, 0.25],
+        "C": [0.3, 0.95, 0.4, 0.35],
+        "D": [0.4, 1.25, 0.4, 0.45],
+        "Gene": ["G1", "G2", "G5", "G7"],
+        "Position": ["Y1"] * 4,
+        "BioReps": ["1", "2", 3, 4],
+        "r2_Std": ["N/A", 0.98, 0.1, 0.13],
+    }, dtype=object).astype({"A": float, "B": float, "C": float, "D": float})
+    pd.testing.assert_frame_equal(X, expected)
+
+
+def test_build_matrix_mixed():
+    """ Test that peptides recurring a different number of times are rejected. """
+    X = ReplicatesTable()
+    _, dups, trips = MapOverlappingPeptides(X)
+
+    with pytest.raises(ValueError):
+        BuildMatrix(pd.concat([dups, trips]), X, ["A", "B", "C", "D"])
+
+
+def test_row_pearson():
+    """ Test that row-wise correlations match stats.pearsonr, and are NaN for missing values or constant rows. """
+    rng = np.random.default_rng(0)
+    X, Y = rng.normal(size=(2, 5, 6))
+    X[3, 2], Y[4] = np.nan, 1.0
+    r = RowPearson(X, Y)
+
+    np.testing.assert_allclose(r[:3], [stats.pearsonr(x, y)[0] for x, y in zip(X[:3], Y[:3])])
+    assert np.all(np.isnan(r[3:]))
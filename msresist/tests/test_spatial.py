@@ -0,0 +1,22 @@
+"""
+Testing file for the Ripley's K estimator.
+"""
+
+import numpy as np
+from ..spatial import RipleysK, RipleysL, WINDOW, poisson
+
+
+def test_ripleys_K():
+    """Test that batched K matches a per-image, per-radius evaluation and is close to the Poisson for random points."""
+    rng = np.random.default_rng(1)
+    images = [rng.uniform((WINDOW["x_min"], WINDOW["y_min"]), (WINDOW["x_max"], WINDOW["y_max"]), size=(n, 2)) for n in (400, 80, 1)]
+    r = np.array([2.0, 0.5, 1.0, 1.5])
+
+    K = RipleysK(images, r)
+    assert K.shape == (3, 4)
+    for ii, points in enumerate(images):
+        for jj, radius in enumerate(r):
+            assert np.isclose(K[ii, jj], RipleysK([points], [radius])[0, 0])
+    assert np.all(K[2] == 0.0)
+    assert np.allclose(K[0] / poisson(r), 1.0, atol=0.2)
+    np.testing.assert_allclose(RipleysL(images, r), np.sqrt(K / np.pi))
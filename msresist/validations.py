@@ -4,7 +4,7 @@ import re
 import pandas as pd
 import numpy as np
 import seaborn as sns
-from .motifs import DictProteomeNameToSeq
+from .motifs import UniprotProteome
 from .pre_processing import MeanCenter
 
 
@@ -22,8 +22,7 @@ def preprocess_ebdt_mcf7():
 
 def pos_to_motif(genes, pos, motif_size=5):
     """Map p-site sequence position to uniprot's proteome and extract motifs."""
-    proteome = open("msresist/data/Sequence_analysis/proteome_uniprot2019.fa", "r")
-    ProteomeDict = DictProteomeNameToSeq(proteome, n="gene")
+    ProteomeDict = UniprotProteome(n="gene")
     motifs = []
     del_GeneToPos = []
     for gene, pos in list(zip(genes, pos)):